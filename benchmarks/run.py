@@ -0,0 +1,275 @@
+"""Benchmark introspection and rendering against the sample app and a synthetic class zoo.
+
+Run from the root of the repository:
+
+    python benchmarks/run.py [--scale 0.25] [--update-baseline]
+
+Every phase is timed, keeping the best of `--repeat` runs, then run again under
+tracemalloc to record its peak memory. Discovery imports the modules it lists, so it
+is run in a fresh process every time, once per `CLASSY_DOC_DISCOVERY` mode. The memory retained by the structures built
+for every class, and their pickled size, are recorded as their `footprint`.
+Results are compared to `benchmarks/baseline.json` and the run fails if any of them
+exceeds its baseline by more than `--tolerance`.
+"""
+import argparse
+import contextlib
+import gc
+import importlib
+import io
+import json
+import os
+import pickle
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+
+
+def setup_django(apps, discovery='import'):
+    import django
+    from django.conf import settings
+
+    settings.configure(
+        BASE_DIR=ROOT,
+        SECRET_KEY='benchmark',
+        INSTALLED_APPS=[
+            'sample',
+            'django.contrib.auth',
+            'django.contrib.contenttypes',
+            'django_classy_doc',
+        ] + apps,
+        DATABASES={'default': {'ENGINE': 'django.db.backends.sqlite3', 'NAME': ':memory:'}},
+        DEFAULT_AUTO_FIELD='django.db.models.BigAutoField',
+        TEMPLATES=[{'BACKEND': 'django.template.backends.django.DjangoTemplates', 'APP_DIRS': True}],
+        CLASSY_DOC_BASES=['sample', 'zoo_'],
+        CLASSY_DOC_DISCOVERY=discovery,
+    )
+    django.setup()
+
+
+def import_views(apps):
+    # Like an URLconf would, so that build_list_of_documentables finds them
+    for app in apps:
+        with contextlib.suppress(ImportError):
+            importlib.import_module(f'{app}.views')
+
+
+def reset_caches():
+    from django_classy_doc import utils
+    utils._own_attributes = None
+
+
+class Phases:
+    """Run every phase of a classify run, keeping what later phases need."""
+
+    def __init__(self):
+        self.klasses = []
+        self.apps = None
+        self.structures = []
+
+    def discovery(self):
+        from django_classy_doc.utils import build_list_of_documentables
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            self.apps, self.klasses = build_list_of_documentables()
+
+    def classify(self):
+        from django_classy_doc.utils import build
+
+        reset_caches()
+        for klass in self.klasses:
+            build(klass)
+
+    def build_context(self):
+        from django_classy_doc.utils import build_context
+
+        reset_caches()
+        self.structures = [build_context(klass) for klass in self.klasses]
+
+    def render(self):
+        from django.template.loader import render_to_string
+        from django_classy_doc import settings as app_settings
+
+        for structure in self.structures:
+            if structure is False:
+                continue
+            render_to_string('django_classy_doc/klass.html', {
+                'klass': structure,
+                'known_apps': app_settings.CLASSY_DOC_KNOWN_APPS,
+            })
+
+    def index(self):
+        from django.template.loader import render_to_string
+        from django_classy_doc.utils import get_index_context
+
+        render_to_string('django_classy_doc/index.html', get_index_context(self.apps))
+
+
+PHASES = ['classify', 'build_context', 'render', 'index']
+DISCOVERY_MODES = {'discovery': 'import', 'static_discovery': 'static'}
+
+
+def discover(apps, trace=False):
+    """Discover the documented classes, in a process where none of their modules were imported yet.
+
+    Importing their views is part of the import discovery, which only finds imported modules.
+    """
+    from django_classy_doc import settings as app_settings
+    from django_classy_doc.utils import build_list_of_documentables
+
+    if trace:
+        tracemalloc.start()
+    start = time.perf_counter()
+    if app_settings.CLASSY_DOC_DISCOVERY == 'import':
+        import_views(apps)
+    with contextlib.redirect_stdout(io.StringIO()):
+        build_list_of_documentables()
+    elapsed = time.perf_counter() - start
+    if trace:
+        return {'peak_kb': tracemalloc.get_traced_memory()[1] // 1024}
+    return {'seconds': elapsed}
+
+
+def cold_discovery(zoo, apps, mode, repeat=3):
+    """Time discovery in `mode` in fresh processes, keeping the best of `repeat` runs, then record its peak memory."""
+    def run(*args):
+        output = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), '--discover', mode, '--zoo', zoo, '--apps', ','.join(apps),
+             *args],
+            check=True, capture_output=True, text=True,
+        ).stdout
+        return json.loads(output)
+
+    timings = [run() for _ in range(repeat)]
+    return {
+        'seconds': round(min(timing['seconds'] for timing in timings), 4),
+        'peak_kb': run('--trace')['peak_kb'],
+    }
+
+
+def footprint(klasses):
+    """Memory retained by the structures built by `build_context`, and their pickled size, per class."""
+    from django_classy_doc.utils import build_context
+
+    reset_caches()
+    gc.collect()
+    tracemalloc.start()
+    structures = [structure for structure in map(build_context, klasses) if structure is not False]
+    reset_caches()
+    gc.collect()
+    retained = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    pickled = sum(len(pickle.dumps(structure)) for structure in structures)
+    return {
+        'retained_kb': round(retained / len(structures) / 1024, 2),
+        'pickled_kb': round(pickled / len(structures) / 1024, 2),
+    }
+
+
+def measure(zoo, apps, repeat=3):
+    phases = Phases()
+    phases.discovery()
+    results = {name: cold_discovery(zoo, apps, mode, repeat) for name, mode in DISCOVERY_MODES.items()}
+    for name in PHASES:
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            getattr(phases, name)()
+            timings.append(time.perf_counter() - start)
+        results[name] = {'seconds': round(min(timings), 4)}
+
+    # Memory is measured in a second pass, tracemalloc slowing down the timed one otherwise
+    for name in PHASES:
+        tracemalloc.start()
+        getattr(phases, name)()
+        results[name]['peak_kb'] = tracemalloc.get_traced_memory()[1] // 1024
+        tracemalloc.stop()
+
+    results['footprint'] = footprint(phases.klasses)
+    results['classes'] = len(phases.klasses)
+    return results
+
+
+# Below these differences, results are noise rather than regressions
+MIN_DELTAS = {'seconds': 0.05, 'peak_kb': 256, 'retained_kb': 2, 'pickled_kb': 2}
+
+
+def compare(results, baseline, tolerance):
+    regressions = []
+    for name in list(DISCOVERY_MODES) + PHASES + ['footprint']:
+        for metric in results[name]:
+            expected = baseline.get(name, {}).get(metric)
+            if expected is None or results[name][metric] - expected < MIN_DELTAS[metric]:
+                continue
+            if results[name][metric] > expected * tolerance:
+                regressions.append(f'{name} {metric}: {results[name][metric]} > {expected} x {tolerance}')
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scale', type=float, default=0.25,
+                        help='Size of the generated class zoo, 1 generating about a thousand classes')
+    parser.add_argument('--repeat', type=int, default=3, help='Number of timed runs of every phase')
+    parser.add_argument('--baseline', default=BASELINE)
+    parser.add_argument('--tolerance', type=float, default=1.5,
+                        help='Ratio to the baseline above which a result is a regression')
+    parser.add_argument('--update-baseline', action='store_true')
+    # Used by cold_discovery, to discover the classes of an already generated zoo
+    parser.add_argument('--discover', choices=sorted(set(DISCOVERY_MODES.values())), help=argparse.SUPPRESS)
+    parser.add_argument('--zoo', help=argparse.SUPPRESS)
+    parser.add_argument('--apps', help=argparse.SUPPRESS)
+    parser.add_argument('--trace', action='store_true', help=argparse.SUPPRESS)
+    options = parser.parse_args()
+
+    if options.discover:
+        sys.path[:0] = [ROOT, options.zoo]
+        apps = options.apps.split(',')
+        setup_django(apps, options.discover)
+        print(json.dumps(discover(apps, options.trace)))
+        return
+
+    with tempfile.TemporaryDirectory(prefix='classy_doc_zoo_') as zoo:
+        sys.path[:0] = [ROOT, zoo, os.path.dirname(os.path.abspath(__file__))]
+
+        from zoo import generate
+        apps = generate(zoo, options.scale)
+        setup_django(apps)
+        import_views(apps)
+
+        results = measure(zoo, apps, options.repeat)
+        results['scale'] = options.scale
+    print(json.dumps(results, indent=2))
+
+    if options.update_baseline:
+        with open(options.baseline, 'w') as f:
+            json.dump(results, f, indent=2)
+            f.write('\n')
+        return
+
+    try:
+        with open(options.baseline) as f:
+            baseline = json.load(f)
+    except OSError:
+        print(f'No baseline at {options.baseline}, run with --update-baseline to create it')
+        return
+
+    if baseline.get('scale') != options.scale:
+        print(f'Baseline was recorded at scale {baseline.get("scale")}, not comparing')
+        return
+
+    regressions = compare(results, baseline, options.tolerance)
+    if regressions:
+        print('REGRESSIONS:\n  ' + '\n  '.join(regressions))
+        sys.exit(1)
+    print('No regression')
+
+
+if __name__ == '__main__':
+    main()
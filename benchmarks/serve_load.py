@@ -0,0 +1,111 @@
+"""Load test the server of `classify --serve` against a plain single-threaded `http.server`.
+
+Run from the root of the repository, after generating the documentation:
+
+    python manage.py classify --gzip
+    python benchmarks/serve_load.py [--directory output] [--clients 16] [--requests 200]
+
+Every client opens a single connection and requests pages in turn, keeping the connection
+alive when the server allows it. `--delay` adds latency to every response, as a slow
+client or network would, which is what makes a single-threaded server queue connections.
+"""
+import argparse
+from http import client, server
+import os
+import socketserver
+import sys
+import threading
+import time
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def delayed(handler, delay):
+    class Handler(handler):
+        def end_headers(self):
+            time.sleep(delay)
+            super().end_headers()
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+
+def start(httpd):
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    return httpd.server_address[1]
+
+
+def run_client(port, paths, requests, headers, results):
+    connection = client.HTTPConnection('127.0.0.1', port, timeout=60)
+    transferred = 0
+    for i in range(requests):
+        connection.request('GET', paths[i % len(paths)], headers=headers)
+        response = connection.getresponse()
+        transferred += len(response.read())
+        if response.will_close:
+            connection.close()
+            connection = client.HTTPConnection('127.0.0.1', port, timeout=60)
+    connection.close()
+    results.append(transferred)
+
+
+def measure(port, paths, clients, requests, headers):
+    results = []
+    threads = [
+        threading.Thread(target=run_client, args=(port, paths, requests, headers, results))
+        for _ in range(clients)
+    ]
+    start_time = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start_time
+    return {
+        'requests/s': round(clients * requests / elapsed, 1),
+        'MB transferred': round(sum(results) / 2 ** 20, 2),
+        'seconds': round(elapsed, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--directory', default=os.path.join(ROOT, 'output'))
+    parser.add_argument('--clients', type=int, default=16)
+    parser.add_argument('--requests', type=int, default=200, help='Number of requests per client')
+    parser.add_argument('--delay', type=float, default=0.01, help='Seconds added to every response')
+    options = parser.parse_args()
+
+    sys.path.insert(0, ROOT)
+    from django_classy_doc.serving import DocsRequestHandler
+
+    pages = sorted(name for name in os.listdir(options.directory) if name.endswith('.html'))
+    if not pages:
+        parser.error(f'No html page in {options.directory}, run `python manage.py classify` first')
+    paths = [f'/{name}' for name in pages]
+
+    def plain(*args, **kwargs):
+        return delayed(server.SimpleHTTPRequestHandler, options.delay)(*args, directory=options.directory, **kwargs)
+
+    def docs(*args, **kwargs):
+        return delayed(DocsRequestHandler, options.delay)(*args, directory=options.directory, **kwargs)
+
+    socketserver.TCPServer.allow_reuse_address = True
+    servers = [
+        ('single-threaded http.server', socketserver.TCPServer(('127.0.0.1', 0), plain), {}),
+        ('classify --serve', server.ThreadingHTTPServer(('127.0.0.1', 0), docs), {}),
+        ('classify --serve, gzip', server.ThreadingHTTPServer(('127.0.0.1', 0), docs), {'Accept-Encoding': 'gzip'}),
+    ]
+    for name, httpd, headers in servers:
+        port = start(httpd)
+        print(f'{name}: {measure(port, paths, options.clients, options.requests, headers)}')
+        httpd.shutdown()
+        httpd.server_close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,102 @@
+"""Generate synthetic Django apps to benchmark django-classy-doc against."""
+import os
+
+
+FIELD_TYPES = [
+    'models.CharField(max_length=255)',
+    'models.IntegerField(default=0)',
+    'models.DateField(null=True)',
+    'models.BooleanField(default=False)',
+    'models.TextField(blank=True)',
+    'models.DecimalField(max_digits=9, decimal_places=2)',
+]
+GENERIC_VIEWS = ['TemplateView', 'ListView', 'DetailView', 'CreateView', 'UpdateView', 'DeleteView', 'FormView']
+
+
+def mixins_module(depth):
+    lines = ['from django.views.generic import View', '']
+    for i in range(depth):
+        parent = f'(Mixin{i - 1})' if i else ''
+        lines += [
+            '',
+            f'class Mixin{i}{parent}:',
+            f'    """Mixin number {i}."""',
+            f'    attr_{i} = {i}',
+            f'    label_{i} = "mixin {i}"',
+            '',
+            f'    def method_{i}(self, arg=None, *args, **kwargs):',
+            f'        """Return `arg`, as mixin {i} does."""',
+            '        return arg',
+            '',
+            '    @property',
+            f'    def prop_{i}(self):',
+            f'        return self.attr_{i}',
+        ]
+        if i and i % 3 == 0:
+            lines += [
+                '',
+                f'    def method_{i - 1}(self, arg=None, *args, **kwargs):',
+                f'        return super().method_{i - 1}(arg, *args, **kwargs)',
+            ]
+    lines += ['', '', f'class DeepView(Mixin{depth - 1}, View):', '    pass', '']
+    return '\n'.join(lines)
+
+
+def models_module(models, fields):
+    lines = ['from django import forms', 'from django.db import models', '']
+    for m in range(models):
+        lines += ['', f'class Wide{m}(models.Model):']
+        for f in range(fields):
+            lines.append(f'    field_{f} = {FIELD_TYPES[f % len(FIELD_TYPES)]}')
+        if m:
+            lines.append(f"    previous = models.ForeignKey('Wide{m - 1}', on_delete=models.CASCADE, related_name='+')")
+        lines += [
+            '',
+            '    def __str__(self):',
+            '        return self.field_0',
+            '',
+            '',
+            f'class Wide{m}Form(forms.ModelForm):',
+            '    extra = forms.CharField()',
+            '',
+            '    class Meta:',
+            f'        model = Wide{m}',
+            "        fields = '__all__'",
+        ]
+    lines.append('')
+    return '\n'.join(lines)
+
+
+def views_module(views, depth):
+    lines = ['from django.views import generic', '', 'from zoo_mixins.views import *  # noqa', '']
+    for v in range(views):
+        generic_view = GENERIC_VIEWS[v % len(GENERIC_VIEWS)]
+        lines += [
+            '',
+            f'class ZooView{v}(Mixin{v % depth}, generic.{generic_view}):',
+            f'    """Synthetic view {v}."""',
+            f"    template_name = 'zoo/view_{v}.html'",
+            '',
+            '    def get_context_data(self, **kwargs):',
+            '        return super().get_context_data(**kwargs)',
+        ]
+    lines.append('')
+    return '\n'.join(lines)
+
+
+def write_app(root, name, modules):
+    path = os.path.join(root, name)
+    os.makedirs(path, exist_ok=True)
+    modules = {'__init__': '', **modules}
+    for module, source in modules.items():
+        with open(os.path.join(path, f'{module}.py'), 'w') as f:
+            f.write(source)
+
+
+def generate(root, scale=1.0):
+    """Write the synthetic apps to `root`, returning their names."""
+    depth = max(2, int(30 * scale))
+    write_app(root, 'zoo_mixins', {'views': mixins_module(depth)})
+    write_app(root, 'zoo_models', {'models': models_module(max(1, int(4 * scale)), max(1, int(300 * scale)))})
+    write_app(root, 'zoo_views', {'views': views_module(max(1, int(1000 * scale)), depth)})
+    return ['zoo_mixins', 'zoo_models', 'zoo_views']
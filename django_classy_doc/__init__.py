@@ -1,16 +1,27 @@
 from django.conf import settings as user_settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+
 from . import app_settings as default_settings
 
 
 class AppSettings:
     def __getattr__(self, name):
         if hasattr(user_settings, name):
-            return getattr(user_settings, name)
-
-        if hasattr(default_settings, name):
-            return getattr(default_settings, name)
+            value = getattr(user_settings, name)
+        elif hasattr(default_settings, name):
+            value = getattr(default_settings, name)
+        else:
+            raise AttributeError(f"Settings object has no attribute '{name}'")
 
-        raise AttributeError(f"Settings object has no attribute '{name}'")
+        # __getattr__ is only called for missing attributes, so later accesses skip it
+        self.__dict__[name] = value
+        return value
 
 
 settings = AppSettings()
+
+
+@receiver(setting_changed)
+def reset_settings(setting, **kwargs):
+    settings.__dict__.pop(setting, None)
@@ -9,3 +9,16 @@ CLASSY_DOC_ALSO_EXCLUDE = []
 CLASSY_DOC_KNOWN_APPS = {
     'Django': ['django']
 }
+CLASSY_DOC_CLASSIFY_CACHE_SIZE = 1024
+CLASSY_DOC_CACHE = None
+CLASSY_DOC_CACHE_TIMEOUT = 3600
+CLASSY_DOC_CACHE_VERSION = None
+CLASSY_DOC_PROFILE = False
+CLASSY_DOC_LAZY_SOURCE = False
+CLASSY_DOC_HIGHLIGHT = False
+CLASSY_DOC_HIGHLIGHT_STYLES = ('default', 'monokai')
+CLASSY_DOC_STREAMING = False
+CLASSY_DOC_DISCOVERY = 'import'
+CLASSY_DOC_COMPACT = False
+CLASSY_DOC_WARMUP = False
+CLASSY_DOC_WARMUP_CONCURRENCY = 2
@@ -4,3 +4,9 @@ from django.apps import AppConfig
 class DjangoClassyDocConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'django_classy_doc'
+
+    def ready(self):
+        from .warmup import should_warm_up, start_warm_up
+
+        if should_warm_up():
+            start_warm_up()
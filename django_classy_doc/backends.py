@@ -0,0 +1,339 @@
+import contextlib
+import io
+import os
+import shutil
+import tarfile
+import tempfile
+import time
+import zipfile
+
+
+class OutputBackend:
+    """Where `classify` writes the files it generates, named by their path relative to the output, `/` separated.
+
+    Used as a context manager: files written are only published, all at once, when the block exits without error.
+    `partial` runs only rewrite some of the files, and may publish them one by one instead.
+    """
+    # Whether files written by a previous run are kept, and pages whose sources haven't changed can be skipped
+    incremental = False
+
+    def __init__(self, path, partial=False):
+        self.path = path
+        self.partial = partial
+
+    def __enter__(self):
+        self.open()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+    def open(self):
+        pass
+
+    def existing(self, prefix=''):
+        """The names of the files, starting with `prefix`, kept from the previous run."""
+        return []
+
+    def write(self, name, data):
+        raise NotImplementedError
+
+    @contextlib.contextmanager
+    def open_file(self, name):
+        """A binary file to write `name` in pieces, rather than all at once."""
+        f = io.BytesIO()
+        yield f
+        self.write(name, f.getvalue())
+
+    def remove(self, name):
+        """Don't keep `name` from the previous run."""
+
+    def close(self):
+        pass
+
+    def abort(self):
+        pass
+
+
+class MemoryBackend(OutputBackend):
+    """Keep the files in `files`, for tests or to post-process them."""
+
+    def __init__(self, path='', partial=False):
+        super().__init__(path, partial)
+        self.files = {}
+
+    def write(self, name, data):
+        self.files[name] = data
+
+
+class DirectoryBackend(OutputBackend):
+    """Write to a new version of the output, a hidden directory next to it, and publish it by pointing `path` to it.
+
+    `path` is a symbolic link to the current version. Replacing it is atomic, so the output never goes missing, even
+    for a moment, and a failed or interrupted run leaves it untouched. Files kept from the previous version are hard
+    linked (copied where links aren't supported) into the new one, so only metadata is written. Where symbolic links
+    aren't supported, the new version is renamed to `path` instead.
+
+    Partial runs write in place instead, each file replacing the previous one atomically, so that rebuilding a few
+    pages doesn't cost a link per file kept. Files are buffered and flushed in batches of `buffer_size` bytes.
+    """
+    incremental = True
+
+    def __init__(self, path, partial=False, buffer_size=8 * 2 ** 20):
+        super().__init__(path, partial)
+        self.buffer_size = buffer_size
+        self.version = None
+        self._existing = None
+        self._buffer = {}
+        self._buffered = 0
+        self._written = set()
+        self._removed = set()
+        self._directories = set()
+
+    @property
+    def directory(self):
+        """Where files are written."""
+        return self.path if self.partial else self.version
+
+    def open(self):
+        parent, name = os.path.split(os.path.abspath(self.path))
+        os.makedirs(parent, exist_ok=True)
+        if self.partial:
+            os.makedirs(self.path, exist_ok=True)
+        else:
+            self.version = os.path.join(parent, f'.{name}.{time.time_ns():x}-{os.getpid()}')
+            os.mkdir(self.version)
+        self._directories = {self.directory}
+
+    def is_version(self, path):
+        """Whether `path` is a version of the output, rather than a directory `path` was pointed to by hand."""
+        parent, name = os.path.split(os.path.abspath(self.path))
+        return os.path.dirname(path) == parent and os.path.basename(path).startswith(f'.{name}.')
+
+    def existing(self, prefix=''):
+        if self._existing is None:
+            self._existing = []
+            for root, _, filenames in os.walk(self.path):
+                directory = os.path.relpath(root, self.path).replace(os.sep, '/')
+                self._existing.extend(
+                    filename if directory == '.' else f'{directory}/{filename}' for filename in filenames
+                )
+            self._existing.sort()
+        return [name for name in self._existing if name.startswith(prefix) and name not in self._removed]
+
+    def staged_path(self, name):
+        path = os.path.join(self.directory, *name.split('/'))
+        directory = os.path.dirname(path)
+        if directory not in self._directories:
+            os.makedirs(directory, exist_ok=True)
+            self._directories.add(directory)
+        return path
+
+    @contextlib.contextmanager
+    def staged_file(self, name):
+        path = self.staged_path(name)
+        if not self.partial:
+            with open(path, 'wb') as f:
+                yield f
+            return
+
+        # Readers of the output see either the previous file or the complete new one
+        temporary = f'{path}.tmp-{os.getpid()}'
+        try:
+            with open(temporary, 'wb') as f:
+                yield f
+            os.replace(temporary, path)
+        except BaseException:
+            with contextlib.suppress(OSError):
+                os.unlink(temporary)
+            raise
+
+    def write(self, name, data):
+        self._removed.discard(name)
+        self._buffered += len(data) - len(self._buffer.get(name, b''))
+        self._buffer[name] = data
+        if self._buffered >= self.buffer_size:
+            self.flush()
+
+    def flush(self):
+        for name, data in self._buffer.items():
+            with self.staged_file(name) as f:
+                f.write(data)
+        self._written.update(self._buffer)
+        self._buffer = {}
+        self._buffered = 0
+
+    @contextlib.contextmanager
+    def open_file(self, name):
+        self._removed.discard(name)
+        self._buffered -= len(self._buffer.pop(name, b''))
+        with self.staged_file(name) as f:
+            yield f
+        self._written.add(name)
+
+    def remove(self, name):
+        self._removed.add(name)
+
+    def close(self):
+        try:
+            self.flush()
+            if self.partial:
+                for name in self._removed:
+                    with contextlib.suppress(FileNotFoundError):
+                        os.unlink(os.path.join(self.path, *name.split('/')))
+                return
+
+            for name in self.existing():
+                if name in self._written:
+                    continue
+                source, target = os.path.join(self.path, *name.split('/')), self.staged_path(name)
+                try:
+                    os.link(source, target)
+                except OSError:
+                    shutil.copy2(source, target)
+        except BaseException:
+            self.abort()
+            raise
+        self.publish()
+
+    def publish(self):
+        """Point `path` to the new version, then remove the previous one."""
+        link = f'{self.version}.link'
+        try:
+            os.symlink(os.path.basename(self.version), link, target_is_directory=True)
+        except (OSError, NotImplementedError):
+            self.swap()
+            return
+
+        previous = os.path.realpath(self.path) if os.path.islink(self.path) else None
+        moved = None
+        try:
+            if os.path.isdir(self.path) and not os.path.islink(self.path):
+                # An output published by `swap` is a directory, replaced by a link once, in two steps
+                previous = moved = f'{self.version}.previous'
+                os.rename(self.path, moved)
+            os.replace(link, self.path)
+        except BaseException:
+            if moved is not None and not os.path.lexists(self.path):
+                os.rename(moved, self.path)
+            with contextlib.suppress(OSError):
+                os.unlink(link)
+            self.abort()
+            raise
+        if previous is not None and self.is_version(previous):
+            shutil.rmtree(previous, ignore_errors=True)
+
+    def swap(self):
+        """Replace the output with the new version, restoring the previous output on failure."""
+        previous = None
+        try:
+            if os.path.isdir(self.path):
+                previous = f'{self.version}.previous'
+                os.rename(self.path, previous)
+            os.rename(self.version, self.path)
+        except BaseException:
+            if previous is not None and os.path.isdir(previous) and not os.path.exists(self.path):
+                os.rename(previous, self.path)
+            self.abort()
+            raise
+        if previous is not None:
+            shutil.rmtree(previous, ignore_errors=True)
+
+    def abort(self):
+        if self.version is not None:
+            shutil.rmtree(self.version, ignore_errors=True)
+
+
+class ArchiveBackend(OutputBackend):
+    """Write every file into a single archive, `path` plus `extension`, replacing it once complete.
+
+    Files are appended to a temporary archive as they are written, one sequential stream.
+    """
+    extension = None
+
+    def __init__(self, path, partial=False):
+        super().__init__(f'{path}{self.extension}', partial)
+        self.temporary = None
+        self.archive = None
+
+    def open(self):
+        self.temporary = f'{self.path}.tmp-{os.getpid()}'
+        self.archive = self.open_archive(self.temporary)
+
+    def open_archive(self, path):
+        raise NotImplementedError
+
+    def add(self, name, f, size):
+        raise NotImplementedError
+
+    def write(self, name, data):
+        self.add(name, io.BytesIO(data), len(data))
+
+    @contextlib.contextmanager
+    def open_file(self, name):
+        # Members are added whole, so they are spooled until complete
+        with tempfile.SpooledTemporaryFile(2 ** 20) as f:
+            yield f
+            size = f.tell()
+            f.seek(0)
+            self.add(name, f, size)
+
+    def close(self):
+        try:
+            self.archive.close()
+            os.replace(self.temporary, self.path)
+        except BaseException:
+            self.abort()
+            raise
+
+    def abort(self):
+        with contextlib.suppress(Exception):
+            self.archive.close()
+        if os.path.exists(self.temporary):
+            os.unlink(self.temporary)
+
+
+class ZipBackend(ArchiveBackend):
+    extension = '.zip'
+
+    def open_archive(self, path):
+        return zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED)
+
+    def add(self, name, f, size):
+        info = zipfile.ZipInfo(name, time.localtime()[:6])
+        info.compress_type = zipfile.ZIP_DEFLATED
+        with self.archive.open(info, 'w', force_zip64=size > zipfile.ZIP64_LIMIT) as member:
+            shutil.copyfileobj(f, member)
+
+
+class TarBackend(ArchiveBackend):
+    extension = '.tar.gz'
+
+    def open_archive(self, path):
+        self.mtime = int(time.time())
+        return tarfile.open(path, 'w:gz')
+
+    def add(self, name, f, size):
+        info = tarfile.TarInfo(name)
+        info.size = size
+        info.mtime = self.mtime
+        info.mode = 0o644
+        self.archive.addfile(info, f)
+
+
+# The backends available to --backend, MemoryBackend instances can be passed by code calling the command
+BACKENDS = {
+    'directory': DirectoryBackend,
+    'zip': ZipBackend,
+    'tar': TarBackend,
+}
+
+
+def get_backend(backend, path, partial=False):
+    """Return the backend writing to `path`, `backend` being the name of one of `BACKENDS`, or an instance."""
+    if isinstance(backend, OutputBackend):
+        return backend
+    return BACKENDS[backend](path, partial)
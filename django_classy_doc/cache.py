@@ -0,0 +1,49 @@
+import hashlib
+import time
+
+from django.core.cache import caches
+
+from . import settings as app_settings
+
+
+def get_cache():
+    """Return the cache backend configured by `CLASSY_DOC_CACHE`, `None` if caching is disabled."""
+    if app_settings.CLASSY_DOC_CACHE is None:
+        return None
+    return caches[app_settings.CLASSY_DOC_CACHE]
+
+
+def make_page(content):
+    return {
+        'content': content,
+        'etag': '"{0}"'.format(hashlib.md5(content.encode()).hexdigest()),
+        'last_modified': int(time.time()),
+    }
+
+
+def get_cached_page(name):
+    """Return the page `name` from the cache, `None` on a miss or if caching is disabled."""
+    cache = get_cache()
+    if cache is None:
+        return None
+    return cache.get(f'classy_doc:{name}', version=app_settings.CLASSY_DOC_CACHE_VERSION)
+
+
+def get_page(name, render):
+    """Return the page `name` from the cache, rendering it with `render()` on a miss."""
+    page = get_cached_page(name)
+    if page is None:
+        page = make_page(render())
+        set_page(name, page)
+    return page
+
+
+def set_page(name, page):
+    cache = get_cache()
+    if cache is None:
+        return
+    cache.set(
+        f'classy_doc:{name}', page,
+        timeout=app_settings.CLASSY_DOC_CACHE_TIMEOUT,
+        version=app_settings.CLASSY_DOC_CACHE_VERSION,
+    )
@@ -0,0 +1,102 @@
+import sys
+
+
+class Declaration:
+    """A compact, picklable, declaration of a class member, as built by the `tf_*` functions of `utils`.
+
+    It only holds strings and numbers: the defining class is kept as interned module and class names, and the source
+    of methods as the tuple of its lines, shared with the source index they were read from and only joined when
+    needed. Declarations can be used like the dicts they replace, `declaration['code']` and `declaration.code` being
+    the same.
+    """
+    __slots__ = (
+        'name', 'type', 'module', 'klass', 'docstring', 'arguments', 'file', 'start', 'total',
+        'object', 'default', 'field_type', 'related', 'known_app', 'signature_html', 'code_html', 'source_url',
+        '_code',
+    )
+    INTERNED = ('name', 'type', 'module', 'klass', 'file')
+    KEYS = frozenset(__slots__[:-1]) | {'defining_class', 'code', 'lines'}
+
+    def __init__(self, name, type, defining_class, code=None, **kwargs):
+        for slot in self.__slots__:
+            setattr(self, slot, None)
+        self.name = name
+        self.type = type
+        self.module, self.klass = defining_class
+        for key, value in kwargs.items():
+            setattr(self, key, value)
+        for key in self.INTERNED:
+            value = getattr(self, key)
+            if value is not None:
+                setattr(self, key, sys.intern(value))
+        self.code = code
+
+    @property
+    def defining_class(self):
+        return (self.module, self.klass)
+
+    @property
+    def lines(self):
+        return {'start': self.start or 0, 'total': self.total or 0}
+
+    @property
+    def code(self):
+        if isinstance(self._code, tuple):
+            return ''.join(self._code)
+        return self._code
+
+    @code.setter
+    def code(self, value):
+        """The source, or the sequence of its lines."""
+        self._code = tuple(value) if isinstance(value, (list, tuple)) else value
+
+    def __getitem__(self, key):
+        if key not in self.KEYS:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __setitem__(self, key, value):
+        if key not in self.KEYS:
+            raise KeyError(key)
+        setattr(self, key, value)
+
+    def __delitem__(self, key):
+        self[key] = None
+
+    def __contains__(self, key):
+        return key in self.KEYS and getattr(self, key) is not None
+
+    def get(self, key, default=None):
+        value = self[key] if key in self.KEYS else None
+        return default if value is None else value
+
+    def pop(self, key, *default):
+        value = self.get(key, *default)
+        if key in self.KEYS:
+            self[key] = None
+        return value
+
+    def copy(self):
+        declaration = object.__new__(self.__class__)
+        for slot in self.__slots__:
+            setattr(declaration, slot, getattr(self, slot))
+        return declaration
+
+    def __reduce__(self):
+        state = tuple(getattr(self, slot) for slot in self.__slots__[:-1]) + (self.code,)
+        return _restore, (state,)
+
+    def __repr__(self):
+        fields = ', '.join(
+            f'{slot}={getattr(self, slot)!r}' for slot in ('type', 'module', 'klass') if getattr(self, slot) is not None
+        )
+        return f'Declaration({fields})'
+
+
+def _restore(state):
+    declaration = object.__new__(Declaration)
+    for slot, value in zip(Declaration.__slots__, state):
+        if slot in Declaration.INTERNED and value is not None:
+            value = sys.intern(value)
+        setattr(declaration, slot, value)
+    return declaration
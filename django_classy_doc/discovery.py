@@ -0,0 +1,128 @@
+import ast
+import importlib.util
+import inspect
+import os
+
+from django.utils.module_loading import import_string
+
+
+def imported_classes(module_name):
+    """Return the names of the classes defined in `module_name` (or its submodules), importing it."""
+    module = import_string(module_name)
+    return [
+        name for name, obj in inspect.getmembers(module)
+        if inspect.isclass(obj) and obj.__module__.startswith(module_name)
+    ]
+
+
+def module_statements(body):
+    """Yield the statements run when a module is imported, looking into conditional blocks."""
+    for node in body:
+        yield node
+        if isinstance(node, (ast.If, ast.Try, ast.With)):
+            for block in ['body', 'orelse', 'finalbody']:
+                yield from module_statements(getattr(node, block, []))
+            for handler in getattr(node, 'handlers', []):
+                yield from module_statements(handler.body)
+
+
+class ParsedModule:
+    """The classes a module file defines, and the names it imports from other modules."""
+
+    def __init__(self, filename):
+        with open(filename, 'rb') as f:
+            tree = ast.parse(f.read(), filename)
+
+        self.classes = []
+        self.exported = None
+        self.imports = []
+        for node in module_statements(tree.body):
+            if isinstance(node, ast.ClassDef):
+                self.classes.append(node.name)
+            elif isinstance(node, ast.ImportFrom):
+                names = [(alias.name, alias.asname or alias.name) for alias in node.names]
+                self.imports.append((node.level, node.module, names))
+            elif isinstance(node, ast.Assign) and any(
+                    isinstance(target, ast.Name) and target.id == '__all__' for target in node.targets):
+                try:
+                    self.exported = [str(name) for name in ast.literal_eval(node.value)]
+                except ValueError:
+                    pass
+
+    def public(self, names):
+        """The `names` a star import of the module imports."""
+        if self.exported is not None:
+            return [name for name in names if name in self.exported]
+        return [name for name in names if not name.startswith('_')]
+
+
+_parsed = {}
+
+
+def parse_module(filename):
+    """Parse `filename`, cached until its modification time or size change."""
+    try:
+        stat = os.stat(filename)
+        key = (stat.st_mtime_ns, stat.st_size)
+        cached = _parsed.get(filename)
+        if cached is None or cached[0] != key:
+            cached = _parsed[filename] = (key, ParsedModule(filename))
+    except (OSError, SyntaxError, ValueError) as e:
+        raise ImportError(f'Unable to parse {filename}: {e}') from e
+    return cached[1]
+
+
+def find_source(module_name):
+    """Return the source file of `module_name` and whether it's a package, importing its parent packages only."""
+    spec = importlib.util.find_spec(module_name)
+    if spec is None:
+        raise ImportError(f'No module named {module_name}')
+    if not spec.has_location or not spec.origin.endswith('.py'):
+        raise ImportError(f'{module_name} has no python source')
+    return spec.origin, spec.submodule_search_locations is not None
+
+
+def resolve(module_name, level, relative_to, is_package):
+    """The absolute name of the module imported by `from <level dots><module_name> import ...` in `relative_to`."""
+    if level == 0:
+        return module_name
+    package = relative_to if is_package else relative_to.rpartition('.')[0]
+    for _ in range(level - 1):
+        package = package.rpartition('.')[0]
+    return f'{package}.{module_name}' if module_name else package
+
+
+def static_classes(module_name):
+    """Return the names of the classes defined in `module_name` (or its submodules), parsing rather than importing it.
+
+    Like `imported_classes`, classes imported from modules outside of `module_name` are ignored.
+    Classes built dynamically, by a function or a metaclass, aren't found.
+    """
+    return sorted(_static_classes(module_name, module_name, frozenset(), {}))
+
+
+def _static_classes(module_name, root, seen, found):
+    if module_name in found:
+        return found[module_name]
+
+    filename, is_package = find_source(module_name)
+    module = parse_module(filename)
+    names = set(module.classes)
+
+    for level, imported, aliases in module.imports:
+        source = resolve(imported, level, module_name, is_package)
+        if source == module_name or source in seen or not (source == root or source.startswith(f'{root}.')):
+            continue
+
+        try:
+            classes = _static_classes(source, root, seen | {module_name}, found)
+        except ImportError:
+            continue
+        for name, alias in aliases:
+            if name == '*':
+                names.update(parse_module(find_source(source)[0]).public(classes))
+            elif name in classes:
+                names.add(alias)
+
+    found[module_name] = names
+    return names
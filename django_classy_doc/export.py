@@ -0,0 +1,194 @@
+import hashlib
+import html
+import inspect
+import json
+import re
+
+from django.utils.html import strip_spaces_between_tags
+
+from .utils import defining_module
+
+
+SCHEMA_VERSION = 1
+FORMATS = ['html', 'json', 'msgpack']
+
+
+def class_path(value):
+    """Return `[module, name]` for a class or a `(module, name)` tuple."""
+    if inspect.isclass(value):
+        return [value.__module__, value.__name__]
+    return list(value)
+
+
+def jsonable(value):
+    if value is None or isinstance(value, (str, int, float, bool)):
+        return value
+    if isinstance(value, (list, tuple)):
+        return [jsonable(item) for item in value]
+    if isinstance(value, dict):
+        return {str(key): jsonable(item) for key, item in value.items()}
+    return str(value)
+
+
+def serialize_declaration(target, declaration):
+    data = {
+        'type': declaration.get('type'),
+        'defining_class': [defining_module(declaration), class_path(declaration['defining_class'])[1]],
+        'known_app': declaration.get('known_app'),
+    }
+    if target == 'attributes':
+        data['value'] = html.unescape(declaration['object'])
+        data['default'] = declaration.get('default')
+    elif target == 'methods':
+        data.update({
+            'docstring': declaration['docstring'],
+            'arguments': declaration['arguments'],
+            'code': declaration['code'],
+            'lines': declaration['lines'],
+            'file': declaration['file'],
+        })
+    elif target == 'fields':
+        data.update({
+            'field_type': declaration['field_type'],
+            'related': jsonable(declaration.get('related')),
+        })
+    return data
+
+
+def serialize_structure(structure):
+    """Return a structure built by `build_context` as plain, JSON serializable, data."""
+    data = {
+        'schema': SCHEMA_VERSION,
+        'name': structure['name'],
+        'module': structure['module'],
+        'docstring': structure['docstring'],
+        'ancestors': [class_path(ancestor) for ancestor in structure['ancestors']],
+        'parents': [class_path(parent) for parent in structure['parents']],
+        'meta': jsonable(structure.get('Meta')),
+    }
+    for target in ['fields', 'attributes', 'methods']:
+        data[target] = {
+            name: [serialize_declaration(target, declaration) for declaration in declarations]
+            for name, declarations in structure[target].items()
+        }
+    data['everything'] = {
+        name: [{'type': declaration['type']} for declaration in declarations]
+        for name, declarations in structure['everything'].items()
+    }
+    return data
+
+
+# Below this size, the docstring and source of a method weigh less inline than the markup loading them
+FRAGMENT_MIN_SIZE = 256
+# Elements whose whitespace is significant
+PRESERVED_ELEMENTS = re.compile(r'<(pre|script|style|textarea)\b.*?</\1>', re.S | re.I)
+
+
+def fragment_name(content, extension):
+    """Content-addressed name of a fragment."""
+    return f'{hashlib.sha1(content.encode()).hexdigest()}.{extension}'
+
+
+def compact_html(content):
+    """Remove the whitespace between tags, outside of the elements where it is significant."""
+    def strip(text):
+        # Bounded by the tags around it, so that the whitespace next to preserved elements goes too
+        return strip_spaces_between_tags(f'>{text}<')[1:-1]
+
+    parts = []
+    end = 0
+    for match in PRESERVED_ELEMENTS.finditer(content):
+        parts.append(strip(content[end:match.start()]))
+        parts.append(match.group())
+        end = match.end()
+    parts.append(strip(content[end:]))
+    return ''.join(parts)
+
+
+def extract_fragments(structure, url='fragments/{0}'):
+    """Move the source of every method declaration out of `structure`, into content-addressed fragments.
+
+    Declarations get a `source_url` pointing at their fragment, returns a dict of fragment name to json.
+    Short sources are left inline.
+    """
+    fragments = {}
+    for declarations in structure['methods'].values():
+        for declaration in declarations:
+            if len(declaration['docstring'] or '') + len(declaration['code'] or '') < FRAGMENT_MIN_SIZE:
+                continue
+            source = {
+                'docstring': declaration.pop('docstring'),
+                'code': declaration.pop('code'),
+                'lines': declaration['lines'],
+            }
+            if 'code_html' in declaration:
+                source['code_html'] = declaration.pop('code_html')
+            fragment = json.dumps(source, sort_keys=True)
+            name = fragment_name(fragment, 'json')
+            fragments[name] = fragment
+            declaration['source_url'] = url.format(name)
+    return fragments
+
+
+def split_inherited(structure, target):
+    """Split the `target` declarations of `structure` between the class and the ancestors defining them.
+
+    Returns the `{name: declarations}` of the members the class defines, with those they override, and a
+    `[(ancestor, {name: [declaration]})]` list of the members every ancestor defines, closest ancestor first.
+    """
+    klass = (structure['module'], structure['name'])
+    own = {}
+    inherited = {tuple(class_path(ancestor)): {} for ancestor in reversed(structure['ancestors'])}
+    for name, declarations in structure[target].items():
+        for declaration in declarations:
+            defining_class = (defining_module(declaration), class_path(declaration['defining_class'])[1])
+            if defining_class == klass:
+                own[name] = declarations
+            elif defining_class in inherited:
+                inherited[defining_class][name] = [declaration]
+    return own, [(ancestor, rows) for ancestor, rows in inherited.items() if rows and ancestor != klass]
+
+
+def index_entries(apps, klasses):
+    """Yield an index entry for every documented class, in the order of the html index."""
+    seen = set()
+    for app, modules in apps.items():
+        for mod, names in modules.items():
+            for name, full_name in names:
+                seen.add(full_name)
+                yield {'app': app, 'module': mod, 'name': name, 'path': full_name}
+
+    for full_name in klasses:
+        if full_name not in seen:
+            yield {'app': None, 'module': None, 'name': full_name.rsplit('.', 1)[-1], 'path': full_name}
+
+
+def get_msgpack():
+    try:
+        import msgpack
+    except ImportError:
+        raise ImportError('The msgpack format requires the msgpack package, run `pip install msgpack`')
+    return msgpack
+
+
+def dumps(data, output_format):
+    if output_format == 'msgpack':
+        return get_msgpack().packb(data, use_bin_type=True)
+    return json.dumps(data, indent=1)
+
+
+def write_index(entries, f, output_format):
+    """Stream the index `entries` to the file `f`, one entry at a time."""
+    if output_format == 'msgpack':
+        # A stream of maps, readable entry by entry with msgpack.Unpacker
+        packer = get_msgpack().Packer(use_bin_type=True)
+        f.write(packer.pack({'schema': SCHEMA_VERSION}))
+        for entry in entries:
+            f.write(packer.pack(entry))
+        return
+
+    f.write(f'{{"schema": {SCHEMA_VERSION}, "classes": [')
+    for i, entry in enumerate(entries):
+        f.write(',\n' if i else '\n')
+        f.write(json.dumps(entry))
+    f.write('\n]}\n')
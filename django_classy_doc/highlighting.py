@@ -0,0 +1,67 @@
+from functools import lru_cache
+import hashlib
+
+from django.core.exceptions import ImproperlyConfigured
+
+from . import settings as app_settings
+from .utils import LRUCache
+
+
+_fragments = LRUCache(4096)
+
+
+def get_pygments():
+    try:
+        from pygments import highlight
+        from pygments.formatters import HtmlFormatter
+        from pygments.lexers import PythonLexer
+    except ImportError:
+        raise ImproperlyConfigured('CLASSY_DOC_HIGHLIGHT requires Pygments, run `pip install pygments`')
+    return highlight, HtmlFormatter, PythonLexer
+
+
+def highlight(code):
+    """Return `code` highlighted as html, memoized by a hash of its content."""
+    digest = hashlib.sha1(code.encode()).hexdigest()
+    try:
+        return _fragments[digest]
+    except KeyError:
+        pass
+
+    pygments_highlight, HtmlFormatter, PythonLexer = get_pygments()
+    html = pygments_highlight(code, PythonLexer(stripnl=False), HtmlFormatter(nowrap=True))
+    _fragments[digest] = html
+    return html
+
+
+@lru_cache(maxsize=8)
+def _get_css(light, dark):
+    _, HtmlFormatter, _ = get_pygments()
+    return '\n'.join([
+        HtmlFormatter(style=light).get_style_defs('[data-bs-theme=light] .highlight'),
+        HtmlFormatter(style=dark).get_style_defs('[data-bs-theme=dark] .highlight'),
+    ])
+
+
+def get_css():
+    """The stylesheet of `CLASSY_DOC_HIGHLIGHT_STYLES`, built once per pair of styles."""
+    light, dark = app_settings.CLASSY_DOC_HIGHLIGHT_STYLES
+    return _get_css(light, dark)
+
+
+def signature(name, declaration):
+    """The method header shown on class pages."""
+    if declaration['type'].endswith('property'):
+        return f'@property\n  def {name}(self)'
+    if declaration['arguments']:
+        return f'def {name}{declaration["arguments"]}'
+    return f'def {name}(self)'
+
+
+def highlight_structure(structure):
+    """Add the highlighted html of their header and code to the method declarations of `structure`."""
+    for name, declarations in structure['methods'].items():
+        for declaration in declarations:
+            declaration['signature_html'] = highlight(signature(name, declaration))
+            if declaration.get('code'):
+                declaration['code_html'] = highlight(declaration['code'])
@@ -1,44 +1,175 @@
 import collections
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+import contextlib
+import gzip
 import os
+import subprocess
+import sys
+import threading
+import time
 
 from django.conf import settings
-from django.core.management.base import BaseCommand
+from django.core.management.base import BaseCommand, CommandError
 from django.template.loader import render_to_string
 
+from ...backends import BACKENDS, get_backend
+from ...export import (
+    FORMATS, compact_html, dumps, extract_fragments, fragment_name, get_msgpack, index_entries, serialize_structure,
+    split_inherited, write_index,
+)
+from ...highlighting import get_css
+from ...manifest import MANIFEST_NAME, Manifest, structure_sources
+from ...profiling import phase, profile
+from ...search import SEARCH_DIR, build_search_index, compact_json, search_terms
+from ...serving import make_server
+from ...watching import Watcher
 from ...utils import build_context, build_list_of_documentables, get_index_context
 from ... import settings as app_settings
 
 
-def serve(port, output):
-    from http import server
-    import socketserver
+# Files shared by every page, written alongside them
+ASSETS_DIR = 'assets'
+
+
+def serve(port, output, background=False):
     import webbrowser
 
-    Handler = server.SimpleHTTPRequestHandler
-    port = int(port)
-    found_free_port = False
-    while not found_free_port:
-        try:
-            httpd = socketserver.TCPServer(('', port), Handler)
-            found_free_port = True
-        except OSError:
-            port += 1
+    httpd = make_server(int(port))
+    port = httpd.server_address[1]
     print('Serving on port: {0}'.format(port))
     webbrowser.open_new_tab(f'http://localhost:{port}/{output}/classify.html')
-    httpd.serve_forever()
+    if background:
+        threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    else:
+        httpd.serve_forever()
+
+
+def write_file(backend, name, content, compress=False):
+    """Write `content` to `name`, and gzipped to `name.gz` if `compress`."""
+    data = content if isinstance(content, bytes) else content.encode()
+    backend.write(name, data)
+    if compress:
+        backend.write(f'{name}.gz', gzip.compress(data, mtime=0))
+
+
+def write_assets(backend, fragments=False, compress=False):
+    """Write the script and the stylesheet pages link to, rather than inlining them in every page."""
+    if fragments or app_settings.CLASSY_DOC_LAZY_SOURCE:
+        write_file(backend, f'{ASSETS_DIR}/lazy.js', render_to_string('django_classy_doc/lazy.js'), compress)
+    if app_settings.CLASSY_DOC_HIGHLIGHT:
+        write_file(backend, f'{ASSETS_DIR}/highlight.css', get_css(), compress)
+
+
+def gen_index(apps, backend, compress=False):
+    index = render_to_string('django_classy_doc/index.html', {
+        **get_index_context(apps), 'search': True, 'assets': f'{ASSETS_DIR}/',
+    })
+    write_file(backend, 'classify.html', index, compress)
+
+
+def gen_search_index(manifest, filenames, backend, compress=False):
+    pages = [
+        (filename, manifest.entries[filename]['klass'], manifest.entries[filename].get('search', {}))
+        for filename in filenames if filename in manifest.entries
+    ]
+    for name in backend.existing(f'{SEARCH_DIR}/'):
+        backend.remove(name)
+
+    page_list = [[filename, klass] for filename, klass, _ in pages]
+    write_file(backend, f'{SEARCH_DIR}/pages.json', compact_json(page_list), compress)
+    for key, entries in build_search_index(pages).items():
+        write_file(backend, f'{SEARCH_DIR}/{key}.json', compact_json(entries), compress)
+
+
+class StreamWriter:
+    """Write to every file of `files` at once, encoding text."""
+
+    def __init__(self, files):
+        self.files = files
+
+    def write(self, data):
+        if isinstance(data, str):
+            data = data.encode()
+        for f in self.files:
+            f.write(data)
+
+
+def gen_data_index(apps, klasses, backend, output_format, compress=False):
+    name = f'classify.{output_format}'
+    with contextlib.ExitStack() as stack:
+        files = [stack.enter_context(backend.open_file(name))]
+        if compress:
+            compressed = stack.enter_context(backend.open_file(f'{name}.gz'))
+            files.append(stack.enter_context(gzip.GzipFile('', 'wb', fileobj=compressed, mtime=0)))
+        write_index(index_entries(apps, klasses), StreamWriter(files), output_format)
+
+
+def extract_inherited(structure, url='fragments/{0}'):
+    """Move the attributes and methods `structure` inherits to a fragment per ancestor, loaded when expanded.
+
+    Their rows only depend on the ancestor, so every subclass shares them. Returns a dict of fragment name to html.
+    """
+    fragments = {}
+    structure['inherited'] = {}
+    for target in ['attributes', 'methods']:
+        structure[target], inherited = split_inherited(structure, target)
+        groups = structure['inherited'][target] = []
+        for ancestor, rows in inherited:
+            group = {'rows': rows, 'declaration': next(iter(rows.values()))[0]}
+            content = compact_html(render_to_string('django_classy_doc/klass/inherited_rows.html', {
+                'group': group,
+                'target': target,
+            }))
+            name = fragment_name(content, 'html')
+            fragments[name] = content
+            groups.append({**group, 'url': url.format(name)})
+    return fragments
+
+
+def render_klass(klass, output_format='html', fragments=False):
+    structure = build_context(klass)
+    if structure is False:
+        return None
+
+    sources = structure_sources(structure)
+    if output_format == 'html':
+        sources['search'] = search_terms(structure)
+    with phase('render', klass):
+        if output_format != 'html':
+            return dumps(serialize_structure(structure), output_format), sources, {}
+
+        extracted = {}
+        if fragments:
+            extracted.update(extract_fragments(structure))
+            if not app_settings.CLASSY_DOC_COMPACT:
+                extracted.update(extract_inherited(structure))
+        output = render_to_string('django_classy_doc/klass.html', {
+            'klass': structure,
+            'known_apps': app_settings.CLASSY_DOC_KNOWN_APPS,
+            'fragments': fragments,
+            'assets': f'{ASSETS_DIR}/',
+        })
+        if fragments:
+            output = compact_html(output)
+    return output, sources, extracted
+
 
+def setup_worker():
+    import django
+    django.setup()
 
-def gen_index(apps, output):
-    index = render_to_string('django_classy_doc/index.html', get_index_context(apps))
-    with open(output, 'w') as f:
-        f.write(index)
 
+def render_klasses(klasses, jobs=1, output_format='html', fragments=False):
+    """Yield the rendered page, sources and fragments of every class in `klasses`, in order."""
+    render = partial(render_klass, output_format=output_format, fragments=fragments)
+    if jobs <= 1 or len(klasses) <= 1:
+        yield from map(render, klasses)
+        return
 
-def output_path(output, filename='classify.html'):
-    path = os.path.join(settings.BASE_DIR, output)
-    if not os.path.exists(path):
-        os.makedirs(path)
-    return os.path.join(path, filename)
+    chunksize = max(1, len(klasses) // (jobs * 4))
+    with ProcessPoolExecutor(max_workers=jobs, initializer=setup_worker) as executor:
+        yield from executor.map(render, klasses, chunksize=chunksize)
 
 
 class Command(BaseCommand):
@@ -51,15 +182,142 @@ class Command(BaseCommand):
         parser.add_argument('-s', '--serve', action='store_true', dest='serve')
         parser.add_argument('--clean', action='store_true', dest='clean',
                             help='Clear html files from output directory before generating new files')
+        parser.add_argument('-j', '--jobs', action='store', dest='jobs', type=int, default=1,
+                            help='Number of processes used to build and render the class pages')
+        parser.add_argument('--force', action='store_true', dest='force',
+                            help='Regenerate every page, even those whose sources have not changed')
+        parser.add_argument('--format', action='store', dest='format', choices=FORMATS, default='html',
+                            help='Write the class structures as html pages or as json/msgpack documents')
+        parser.add_argument('--fragments', action='store_true', dest='fragments',
+                            help='Write the source of methods to shared fragments, loaded when a method is expanded')
+        parser.add_argument('--backend', action='store', dest='backend', choices=BACKENDS, default='directory',
+                            help='Write the output to a directory, swapped with the previous one once complete, '
+                                 'or to a single zip or tar archive named after --output')
+        parser.add_argument('--gzip', action='store_true', dest='gzip',
+                            help='Also write gzipped copies of every file, sent by --serve to clients accepting them')
+        parser.add_argument('--watch', action='store_true', dest='watch',
+                            help='Keep running, rebuilding the pages of the classes whose sources change')
+        parser.add_argument('--watch-interval', action='store', dest='watch_interval', type=float, default=1.0,
+                            help='Seconds between two polls of the sources by --watch')
+        parser.add_argument('--partial', action='store_true', dest='partial',
+                            help='Only write the pages of the given classes, keeping the index and other pages')
+        parser.add_argument('--profile', action='store_true', dest='profile',
+                            help='Report the time and allocations spent per phase, class and module')
+        parser.add_argument('--profile-top', action='store', dest='profile_top', type=int, default=10,
+                            help='Number of slowest classes and modules to report')
+        parser.add_argument('--profile-dump', action='store', dest='profile_dump', default=None,
+                            help='Also write cProfile stats to this file, implies --profile')
 
     def handle(self, *args, **options):
-        if options['clean']:
-            for filename in os.listdir(os.path.join(settings.BASE_DIR, options['output'])):
-                if not filename.endswith('.html'):
+        output_format = options['format']
+        if output_format == 'msgpack':
+            try:
+                get_msgpack()
+            except ImportError as e:
+                raise CommandError(e)
+        if (options['serve'] or options['watch']) and options['backend'] != 'directory':
+            raise CommandError('--serve and --watch require the directory backend')
+
+        if options['profile'] or options['profile_dump']:
+            if options['jobs'] > 1:
+                self.stderr.write('Profiling happens in a single process, ignoring --jobs')
+                options['jobs'] = 1
+            with profile(options['profile_dump']) as profiler:
+                self.generate(options)
+            self.stdout.write(profiler.report(options['profile_top']))
+        else:
+            self.generate(options)
+
+        if options['serve']:
+            serve(options['port'], options['output'], background=options['watch'])
+        if options['watch']:
+            self.watch(options)
+
+    def rebuild_args(self, options, klasses):
+        script = os.path.abspath(sys.argv[0])
+        if os.path.basename(script) == '__main__.py':
+            # Run with `python -m django`, from the current directory like this process
+            args = [sys.executable, '-m', 'django']
+        else:
+            # manage.py or django-admin, which put their own directory on sys.path wherever they're run from
+            args = [sys.executable, script]
+        args += ['classify', '--partial', '--output', options['output'],
+                 '--format', options['format'], '--jobs', str(options['jobs'])]
+        for option in ['fragments', 'gzip']:
+            if options[option]:
+                args.append(f'--{option}')
+        for option in ['settings', 'pythonpath']:
+            if options.get(option):
+                args += [f'--{option}', options[option]]
+        return args + sorted(klasses)
+
+    def watch(self, options):
+        """Rebuild the pages affected by every change to their sources, until interrupted.
+
+        Pages are rebuilt by a new process, changed modules can't be reliably reloaded in this one.
+        """
+        manifest_path = os.path.join(settings.BASE_DIR, options['output'], MANIFEST_NAME)
+        watcher = Watcher(Manifest.load(manifest_path), options['format'])
+        self.stdout.write(f'Watching {len(watcher.index.files())} files for changes, press Ctrl+C to stop')
+
+        # Pages whose rebuild failed, retried with the next change
+        failed = {}
+        try:
+            while True:
+                time.sleep(options['watch_interval'])
+                changed = watcher.poll()
+                if not changed:
+                    continue
+
+                pages = {**failed, **watcher.index.affected(changed)}
+                for filename in changed:
+                    self.stdout.write(f'Changed: {filename}')
+                if not pages:
                     continue
-                file_path = os.path.join(settings.BASE_DIR, options['output'], filename)
-                if os.path.isfile(file_path) or os.path.islink(file_path):
-                    os.unlink(file_path)
+
+                failed = {} if self.rebuild(options, pages) else pages
+                watcher.update(Manifest.load(manifest_path), pages)
+        except KeyboardInterrupt:
+            pass
+
+    def rebuild(self, options, pages):
+        """Rebuild `pages`, a `{filename: klass}` dict, returning whether it succeeded."""
+        self.stdout.write(f'Rebuilding {len(pages)} pages')
+        result = subprocess.run(self.rebuild_args(options, set(pages.values())))
+        if result.returncode:
+            self.stderr.write(
+                f'Rebuilding failed with exit status {result.returncode}, '
+                f'the {len(pages)} pages will be rebuilt with the next change'
+            )
+            return False
+        return True
+
+    def generate(self, options):
+        output_format = options['format']
+        output = os.path.join(settings.BASE_DIR, options['output'])
+        backend = get_backend(options['backend'], output, options['partial'])
+        manifest = Manifest(
+            os.path.join(output, MANIFEST_NAME),
+            variant=f'format={output_format},fragments={options["fragments"]},gzip={options["gzip"]}',
+        )
+        if backend.incremental and not (options['clean'] or options['force']):
+            manifest.entries = Manifest.load(manifest.path).entries
+
+        backend.open()
+        try:
+            self.write(backend, manifest, options)
+            with phase('write'):
+                backend.close()
+        except BaseException:
+            backend.abort()
+            raise
+
+    def write(self, backend, manifest, options):
+        output_format = options['format']
+        if options['clean']:
+            for name in backend.existing():
+                if '/' not in name and name.endswith(('.html', '.html.gz')):
+                    backend.remove(name)
 
         klasses = options['klass']
         apps = collections.defaultdict(lambda: collections.defaultdict(list))
@@ -67,25 +325,71 @@ class Command(BaseCommand):
         if len(klasses) == 0:
             apps, klasses = build_list_of_documentables(apps)
 
-        for klass in klasses:
-            structure = build_context(klass)
-            if structure is False:
-                continue
-
-            output = render_to_string('django_classy_doc/klass.html', {
-                'klass': structure,
-                'known_apps': app_settings.CLASSY_DOC_KNOWN_APPS,
+        filenames = {
+            klass: f'{klass}.{output_format}' if len(klasses) > 1 or options['partial'] else f'classify.{output_format}'
+            for klass in klasses
+        }
+        if options['partial']:
+            # Pages keep the name they were first written with
+            filenames.update({
+                entry['klass']: filename for filename, entry in manifest.entries.items()
+                if entry['klass'] in filenames and filename.endswith(f'.{output_format}')
             })
+        with phase('manifest'):
+            stale = [klass for klass in klasses if not manifest.is_fresh(klass, filenames[klass])]
+        if len(stale) < len(klasses):
+            self.stdout.write(f'Skipping {len(klasses) - len(stale)} unchanged classes')
 
-            filename = 'classify.html'
-            if len(klasses) > 1:
-                filename = f'{klass}.html'
+        if output_format == 'html':
+            write_assets(backend, options['fragments'], options['gzip'])
 
-            with open(output_path(options['output'], filename), 'w') as f:
-                f.write(output)
+        written_fragments = set()
+        if options['fragments']:
+            existing = {name[len('fragments/'):] for name in backend.existing('fragments/')}
+            written_fragments.update(
+                filename for filename in existing
+                if not filename.endswith('.gz') and (not options['gzip'] or f'{filename}.gz' in existing)
+            )
 
-        if len(klasses) > 1:
-            gen_index(apps, output_path(options['output']))
+        pages = render_klasses(stale, options['jobs'], output_format, options['fragments'])
+        for klass, page in zip(stale, pages):
+            if page is None:
+                continue
 
-        if options['serve']:
-            serve(options['port'], options['output'])
+            output, sources, fragments = page
+            with phase('write', klass):
+                for name, fragment in fragments.items():
+                    if name in written_fragments:
+                        continue
+                    write_file(backend, f'fragments/{name}', fragment, options['gzip'])
+                    written_fragments.add(name)
+
+                write_file(backend, filenames[klass], output, options['gzip'])
+            sources['fragments'] = sorted(fragments)
+            manifest.record(klass, filenames[klass], sources)
+
+        if backend.incremental:
+            # Drop the fragments no published page uses anymore
+            published = set(filenames.values()) | set(backend.existing())
+            used = {
+                fragment for filename, entry in manifest.entries.items() if filename in published
+                for fragment in entry.get('fragments', [])
+            }
+            for name in backend.existing('fragments/'):
+                fragment = name[len('fragments/'):]
+                if (fragment[:-len('.gz')] if fragment.endswith('.gz') else fragment) not in used:
+                    backend.remove(name)
+            write_file(backend, MANIFEST_NAME, manifest.dumps())
+
+        if len(klasses) > 1 and not options['partial']:
+            with phase('index'):
+                if output_format == 'html':
+                    gen_index(apps, backend, options['gzip'])
+                    gen_search_index(manifest, [filenames[klass] for klass in klasses], backend, options['gzip'])
+                else:
+                    gen_data_index(apps, klasses, backend, output_format, options['gzip'])
+        elif options['partial'] and output_format == 'html' and backend.existing(f'{SEARCH_DIR}/'):
+            # The index page lists the same classes, but their search terms may have changed
+            with phase('index'):
+                pages = sorted(filename for filename in manifest.entries if filename.endswith('.html'))
+                gen_search_index(manifest, pages, backend, options['gzip'])
@@ -0,0 +1,153 @@
+import hashlib
+import inspect
+import json
+import os
+import pydoc
+import sys
+
+from django.template.loader import get_template
+
+from . import app_settings as default_settings
+from . import settings as app_settings
+
+
+MANIFEST_NAME = '.classify-manifest.json'
+TEMPLATES = [
+    'django_classy_doc/base.html',
+    'django_classy_doc/klass.html',
+    'django_classy_doc/klass/heading.html',
+    'django_classy_doc/klass/meta.html',
+    'django_classy_doc/klass/fields.html',
+    'django_classy_doc/klass/attributes.html',
+    'django_classy_doc/klass/methods.html',
+    'django_classy_doc/klass/method_row.html',
+    'django_classy_doc/klass/attribute_row.html',
+    'django_classy_doc/klass/inherited.html',
+    'django_classy_doc/klass/inherited_header.html',
+    'django_classy_doc/klass/inherited_rows.html',
+    'django_classy_doc/klass/lazy_assets.html',
+    'django_classy_doc/klass/signature.html',
+    'django_classy_doc/klass/everything.html',
+    'django_classy_doc/klass/compact/assets.html',
+    'django_classy_doc/klass/compact/fields.html',
+    'django_classy_doc/klass/compact/attributes.html',
+    'django_classy_doc/klass/compact/methods.html',
+    'django_classy_doc/klass/compact/overrides.html',
+    'django_classy_doc/lazy_source.html',
+    'django_classy_doc/lazy.js',
+    'django_classy_doc/show_checkboxes.html',
+]
+
+
+def module_file(module_name):
+    module = sys.modules.get(module_name)
+    filename = getattr(module, '__file__', None)
+    if filename is None:
+        return None
+    return os.path.abspath(filename)
+
+
+def klass_source_files(klass):
+    """Return the module files of `klass` and its ancestors, `None` if it can't be resolved."""
+    try:
+        obj = pydoc.locate(klass)
+    except pydoc.ErrorDuringImport:
+        return None
+    if not inspect.isclass(obj):
+        return None
+
+    files = {module_file(cls.__module__) for cls in inspect.getmro(obj)}
+    files.discard(None)
+    return files
+
+
+def structure_sources(structure):
+    """Return the files and ancestors behind a structure built by `build_context`."""
+    files = {module_file(module) for module, _ in structure['ancestors']}
+    for declarations in structure['methods'].values():
+        files.update(declaration.get('file') for declaration in declarations)
+    files.discard(None)
+
+    return {
+        'files': sorted({os.path.abspath(filename) for filename in files}),
+        'ancestors': [f'{module}.{name}' for module, name in structure['ancestors']],
+    }
+
+
+class Manifest:
+    """Fingerprints of the source files behind every page generated in an output directory."""
+
+    def __init__(self, path, entries=None, variant=''):
+        self.path = path
+        self.entries = entries or {}
+        self.variant = variant
+        self._hashes = {}
+        self._environment = None
+
+    @classmethod
+    def load(cls, path, variant=''):
+        try:
+            with open(path) as f:
+                entries = json.load(f)
+        except (OSError, ValueError):
+            entries = {}
+        return cls(path, entries, variant)
+
+    def dumps(self):
+        return json.dumps(self.entries, indent=1, sort_keys=True)
+
+    def file_hash(self, filename):
+        if filename not in self._hashes:
+            try:
+                with open(filename, 'rb') as f:
+                    self._hashes[filename] = hashlib.sha1(f.read()).hexdigest()
+            except OSError:
+                self._hashes[filename] = None
+        return self._hashes[filename]
+
+    @property
+    def environment(self):
+        """Hash of what, besides the sources, a page depends on: templates, settings, options and this package."""
+        if self._environment is None:
+            files = [get_template(name).origin.name for name in TEMPLATES]
+            package = os.path.dirname(os.path.abspath(__file__))
+            for root, _, filenames in os.walk(package):
+                files.extend(os.path.join(root, name) for name in filenames if name.endswith('.py'))
+
+            digest = hashlib.sha1(self.variant.encode())
+            for filename in sorted(files):
+                digest.update(f'{filename}:{self.file_hash(filename)}\n'.encode())
+            for name in sorted(dir(default_settings)):
+                if name.startswith('CLASSY_DOC_'):
+                    digest.update(f'{name}={getattr(app_settings, name)!r}\n'.encode())
+            self._environment = digest.hexdigest()
+        return self._environment
+
+    def fingerprint(self, files):
+        digest = hashlib.sha1(self.environment.encode())
+        for filename in sorted(files):
+            digest.update(f'{filename}:{self.file_hash(filename)}\n'.encode())
+        return digest.hexdigest()
+
+    def is_fresh(self, klass, filename):
+        """Whether the page `filename` of `klass` exists and none of its sources changed."""
+        entry = self.entries.get(filename)
+        if entry is None or entry['klass'] != klass:
+            return False
+        if not os.path.exists(os.path.join(os.path.dirname(self.path), filename)):
+            return False
+
+        files = klass_source_files(klass)
+        if files is None:
+            return False
+        return self.fingerprint(files | set(entry['files'])) == entry['fingerprint']
+
+    def record(self, klass, filename, sources):
+        self.entries[filename] = {
+            'klass': klass,
+            'files': sources['files'],
+            'ancestors': sources['ancestors'],
+            'fingerprint': self.fingerprint(sources['files']),
+            'search': sources.get('search', {}),
+            'fragments': sources.get('fragments', []),
+        }
@@ -0,0 +1,114 @@
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+
+from . import settings as app_settings
+
+
+_END = object()
+
+
+class PrefixTrie:
+    """Character trie telling whether a string starts with any of its prefixes."""
+
+    def __init__(self, prefixes=()):
+        self.root = {}
+        for prefix in prefixes:
+            self.add(prefix)
+
+    def add(self, prefix):
+        node = self.root
+        for char in prefix:
+            node = node.setdefault(char, {})
+        node[_END] = True
+
+    def match(self, string):
+        node = self.root
+        if _END in node:
+            return True
+        for char in string:
+            node = node.get(char)
+            if node is None:
+                return False
+            if _END in node:
+                return True
+        return False
+
+
+class Matcher:
+    """Answers which dotted paths are documented, and which known app owns them, from the settings."""
+
+    def __init__(self):
+        self.apps = PrefixTrie(list(settings.INSTALLED_APPS) + list(app_settings.CLASSY_DOC_NON_INSTALLED_APPS))
+        self.bases = PrefixTrie(app_settings.CLASSY_DOC_BASES)
+        self.module_types = {mod for mod in app_settings.CLASSY_DOC_MODULE_TYPES if '.' not in mod}
+        self.dotted_module_types = [f'.{mod}.' for mod in app_settings.CLASSY_DOC_MODULE_TYPES if '.' in mod]
+        self.also_include = set(app_settings.CLASSY_DOC_ALSO_INCLUDE)
+        self.also_exclude = set(app_settings.CLASSY_DOC_ALSO_EXCLUDE)
+
+        self.known_app_names = list(app_settings.CLASSY_DOC_KNOWN_APPS.keys())
+        self.known_modules = {}
+        for index, mods in enumerate(app_settings.CLASSY_DOC_KNOWN_APPS.values()):
+            for mod in mods:
+                self.known_modules.setdefault(mod, set()).add(index)
+        self._owners = {}
+
+    def is_base(self, path):
+        return self.bases.match(path)
+
+    def has_module_type(self, path):
+        if any(part in self.module_types for part in path.split('.')[1:-1]):
+            return True
+        return any(mod in path for mod in self.dotted_module_types)
+
+    def is_documented(self, klass):
+        """Whether the dotted path of a class passes the `CLASSY_DOC_*` filters."""
+        if klass in self.also_include:
+            return True
+        if klass in self.also_exclude:
+            return False
+        return self.apps.match(klass) and self.bases.match(klass) and self.has_module_type(klass)
+
+    def owners(self, module_name):
+        """Indexes of the known apps `module_name` belongs to."""
+        try:
+            return self._owners[module_name]
+        except KeyError:
+            pass
+
+        owners = set()
+        parts = module_name.split('.')
+        for i in range(len(parts), 0, -1):
+            owners.update(self.known_modules.get('.'.join(parts[:i]), ()))
+        self._owners[module_name] = owners
+        return owners
+
+    def known_app(self, module_name):
+        """Name of the first known app `module_name` belongs to, `None` if there is none."""
+        owners = self.owners(module_name)
+        if not owners:
+            return None
+        return self.known_app_names[min(owners)]
+
+    def owns(self, app, module_name):
+        try:
+            return self.known_app_names.index(app) in self.owners(module_name)
+        except ValueError:
+            return False
+
+
+_matcher = None
+
+
+def get_matcher():
+    global _matcher
+    if _matcher is None:
+        _matcher = Matcher()
+    return _matcher
+
+
+@receiver(setting_changed)
+def reset_matcher(setting, **kwargs):
+    global _matcher
+    if setting == 'INSTALLED_APPS' or setting.startswith('CLASSY_DOC_'):
+        _matcher = None
@@ -0,0 +1,83 @@
+import contextlib
+from contextvars import ContextVar
+import cProfile
+from collections import defaultdict
+import sys
+import time
+
+
+_active = ContextVar('classy_doc_profiler', default=None)
+_inactive = contextlib.nullcontext()
+
+
+class Profiler:
+    """Wall time and net allocated blocks per phase, per class and per module.
+
+    Phases nest (`source` happens during `classify` for instance), their times are inclusive.
+    """
+
+    def __init__(self, dump=None):
+        self.phases = defaultdict(lambda: {'calls': 0, 'seconds': 0.0, 'blocks': 0})
+        self.klasses = defaultdict(lambda: {'seconds': 0.0, 'blocks': 0})
+        self.modules = defaultdict(lambda: {'seconds': 0.0, 'blocks': 0})
+        self.dump = dump
+        self.cprofile = cProfile.Profile() if dump else None
+
+    @contextlib.contextmanager
+    def phase(self, name, klass=None, module=None):
+        blocks = sys.getallocatedblocks()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            blocks = sys.getallocatedblocks() - blocks
+            stats = self.phases[name]
+            stats['calls'] += 1
+            stats['seconds'] += elapsed
+            stats['blocks'] += blocks
+            if klass is not None:
+                self.klasses[klass]['seconds'] += elapsed
+                self.klasses[klass]['blocks'] += blocks
+                module = module or klass.rpartition('.')[0]
+            if module is not None:
+                self.modules[module]['seconds'] += elapsed
+                self.modules[module]['blocks'] += blocks
+
+    def report(self, top=10):
+        lines = [f'{"phase":<16}{"calls":>8}{"seconds":>12}{"blocks":>12}']
+        for name, stats in sorted(self.phases.items(), key=lambda item: -item[1]['seconds']):
+            lines.append(f'{name:<16}{stats["calls"]:>8}{stats["seconds"]:>12.4f}{stats["blocks"]:>12}')
+
+        for title, timings in [('classes', self.klasses), ('modules', self.modules)]:
+            lines += ['', f'Slowest {title}:', f'{"seconds":>10}{"blocks":>12}']
+            for name, stats in sorted(timings.items(), key=lambda item: -item[1]['seconds'])[:top]:
+                lines.append(f'{stats["seconds"]:>10.4f}{stats["blocks"]:>12}  {name}')
+
+        if self.dump:
+            lines += ['', f'cProfile stats written to {self.dump}']
+        return '\n'.join(lines)
+
+
+@contextlib.contextmanager
+def profile(dump=None):
+    """Profile the phases run within the block, optionally dumping cProfile stats to `dump`."""
+    profiler = Profiler(dump)
+    token = _active.set(profiler)
+    if profiler.cprofile:
+        profiler.cprofile.enable()
+    try:
+        yield profiler
+    finally:
+        if profiler.cprofile:
+            profiler.cprofile.disable()
+            profiler.cprofile.dump_stats(dump)
+        _active.reset(token)
+
+
+def phase(name, klass=None, module=None):
+    """Record the block as `name` in the active profiler, if any."""
+    profiler = _active.get()
+    if profiler is None:
+        return _inactive
+    return profiler.phase(name, klass, module)
@@ -0,0 +1,49 @@
+from collections import defaultdict
+import json
+
+from .export import class_path
+
+
+SEARCH_DIR = 'search'
+KINDS = {'fields': 'field', 'attributes': 'attribute', 'methods': 'method'}
+
+
+def shard_key(name):
+    """The shard holding `name`: its first character, leading underscores aside, `_` if not alphanumeric."""
+    key = name.lstrip('_')[:1].lower()
+    return key if key.isascii() and key.isalnum() else '_'
+
+
+def search_terms(structure):
+    """Return the names found on the page of `structure`, as `{defining class: {kind: [names]}}`."""
+    terms = defaultdict(lambda: defaultdict(list))
+    terms[f'{structure["module"]}.{structure["name"]}']['class'].append(structure['name'])
+    for target, kind in KINDS.items():
+        for name, declarations in structure[target].items():
+            module, klass = class_path(declarations[-1]['defining_class'])
+            terms[f'{module}.{klass}'][kind].append(name)
+    return {defining: dict(kinds) for defining, kinds in terms.items()}
+
+
+def build_search_index(pages):
+    """Return the shards of the search index of `pages`, a list of `(filename, klass, terms)`.
+
+    Every shard lists `[name, kind, defining class, [page indexes]]`, sorted by name.
+    """
+    postings = defaultdict(list)
+    for page, (_, _, terms) in enumerate(pages):
+        for defining, kinds in terms.items():
+            for kind, names in kinds.items():
+                for name in names:
+                    postings[(name, kind, defining)].append(page)
+
+    shards = defaultdict(list)
+    for (name, kind, defining), page_indexes in postings.items():
+        shards[shard_key(name)].append([name, kind, defining, page_indexes])
+    for entries in shards.values():
+        entries.sort(key=lambda entry: (entry[0].lstrip('_').lower(), entry[0], entry[1], entry[2]))
+    return shards
+
+
+def compact_json(data):
+    return json.dumps(data, separators=(',', ':'))
@@ -0,0 +1,99 @@
+import datetime
+import email.utils
+from http import server
+import os
+
+
+def accepts_gzip(accept_encoding):
+    """Whether an `Accept-Encoding` header allows gzip, explicitly or through `*`."""
+    qualities = {}
+    for coding in accept_encoding.split(','):
+        name, _, params = coding.partition(';')
+        quality = 1.0
+        for param in params.split(';'):
+            key, _, value = param.partition('=')
+            if key.strip().lower() == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        qualities.setdefault(name.strip().lower(), quality)
+    return qualities.get('gzip', qualities.get('*', 0.0)) > 0
+
+
+class DocsRequestHandler(server.SimpleHTTPRequestHandler):
+    """Serve generated documentation with keep-alive, conditional requests and precompressed files.
+
+    `page.html.gz`, as written by `classify --gzip`, is sent in place of `page.html` to clients accepting gzip.
+    """
+    protocol_version = 'HTTP/1.1'
+    # Headers and body are written separately, which Nagle's algorithm delays on kept-alive connections
+    disable_nagle_algorithm = True
+
+    def send_head(self):
+        path = self.translate_path(self.path)
+        if os.path.isdir(path) or path.endswith('/'):
+            return super().send_head()
+
+        gzipped = accepts_gzip(self.headers.get('Accept-Encoding', '')) and os.path.isfile(f'{path}.gz')
+        try:
+            f = open(f'{path}.gz' if gzipped else path, 'rb')
+        except OSError:
+            self.send_error(404, 'File not found')
+            return None
+
+        try:
+            fs = os.fstat(f.fileno())
+            etag = '"{0:x}-{1:x}{2}"'.format(fs.st_mtime_ns, fs.st_size, '-gzip' if gzipped else '')
+            last_modified = self.date_time_string(int(fs.st_mtime))
+
+            if self.not_modified(etag, int(fs.st_mtime)):
+                f.close()
+                self.send_response(304)
+                self.send_header('ETag', etag)
+                self.send_header('Last-Modified', last_modified)
+                self.send_header('Vary', 'Accept-Encoding')
+                self.end_headers()
+                return None
+
+            self.send_response(200)
+            self.send_header('Content-Type', self.guess_type(path))
+            self.send_header('Content-Length', str(fs.st_size))
+            self.send_header('ETag', etag)
+            self.send_header('Last-Modified', last_modified)
+            self.send_header('Cache-Control', 'no-cache')
+            self.send_header('Vary', 'Accept-Encoding')
+            if gzipped:
+                self.send_header('Content-Encoding', 'gzip')
+            self.end_headers()
+            return f
+        except Exception:
+            f.close()
+            raise
+
+    def not_modified(self, etag, mtime):
+        if 'If-None-Match' in self.headers:
+            tags = [tag.strip() for tag in self.headers['If-None-Match'].split(',')]
+            return etag in tags or '*' in tags
+
+        if 'If-Modified-Since' in self.headers:
+            try:
+                since = email.utils.parsedate_to_datetime(self.headers['If-Modified-Since'])
+            except (TypeError, IndexError, OverflowError, ValueError):
+                return False
+            if since.tzinfo is None:
+                since = since.replace(tzinfo=datetime.timezone.utc)
+            return since.timestamp() >= mtime
+        return False
+
+
+def make_server(port, directory=None):
+    """Return a threaded server for `directory` on `port`, or on the first free port after it."""
+    def handler(*args, **kwargs):
+        return DocsRequestHandler(*args, directory=directory, **kwargs)
+
+    while True:
+        try:
+            return server.ThreadingHTTPServer(('', port), handler)
+        except OSError:
+            port += 1
@@ -0,0 +1,68 @@
+import ast
+from functools import lru_cache
+import inspect
+import linecache
+
+
+class SourceIndex:
+    """Line ranges of the function and class definitions of a source file, keyed by their first line."""
+
+    def __init__(self, filename):
+        self.filename = filename
+        self.lines = linecache.getlines(filename)
+        self.blocks = {}
+
+        try:
+            tree = ast.parse(''.join(self.lines), filename)
+        except (SyntaxError, ValueError):
+            return
+
+        for node in ast.walk(tree):
+            if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+                # Like co_firstlineno, a definition starts at its first decorator
+                start = node.decorator_list[0].lineno if node.decorator_list else node.lineno
+                self.blocks[start] = (start, node.end_lineno)
+
+    def getsourcelines(self, first_line):
+        start, end = self.blocks[first_line]
+        return self.lines[start - 1:end], start
+
+
+@lru_cache(maxsize=256)
+def get_index(filename):
+    return SourceIndex(filename)
+
+
+_sourcefiles = {}
+
+
+def getsourcefile(code):
+    """Memoized `inspect.getsourcefile` of a code object, per file rather than per function."""
+    try:
+        return _sourcefiles[code.co_filename]
+    except KeyError:
+        filename = _sourcefiles[code.co_filename] = inspect.getsourcefile(code)
+        return filename
+
+
+def getsourcelines(func):
+    """Return `(lines, start_line, filename)` like `inspect.getsourcelines` and `inspect.getsourcefile`.
+
+    Functions are looked up in a per-file index shared by every class, other objects go through inspect.
+    """
+    obj = inspect.unwrap(func)
+    if inspect.ismethod(obj):
+        obj = obj.__func__
+
+    code = getattr(obj, '__code__', None)
+    if code is not None:
+        filename = getsourcefile(code)
+        if filename is not None:
+            try:
+                lines, start_line = get_index(filename).getsourcelines(code.co_firstlineno)
+                return lines, start_line, filename
+            except KeyError:
+                pass
+
+    lines, start_line = inspect.getsourcelines(func)
+    return lines, start_line, inspect.getsourcefile(func)
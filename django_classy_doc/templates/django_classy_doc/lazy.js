@@ -0,0 +1,55 @@
+document.addEventListener('alpine:init', () => {
+  // Built without Alpine, so that every lazy declaration is a single empty element
+  Alpine.data('lazySource', (url) => ({
+    loaded: false,
+    load() {
+      if (this.loaded) {
+        return;
+      }
+      this.loaded = true;
+      fetch(url)
+        .then(response => response.json())
+        .then(data => {
+          if (data.docstring) {
+            const docstring = document.createElement('pre');
+            docstring.className = 'lazy-docstring lead mt-2 mx-3 p-2 rounded';
+            docstring.textContent = data.docstring;
+            this.$el.append(docstring);
+          }
+          if (data.lines.total > 0) {
+            const pre = document.createElement('pre');
+            const code = document.createElement('code');
+            pre.className = data.code_html ? 'highlight line-numbers' : 'line-numbers';
+            pre.dataset.start = data.lines.start;
+            if (data.code_html) {
+              code.innerHTML = data.code_html;
+            } else {
+              code.className = 'language-python';
+              code.textContent = data.code;
+            }
+            pre.append(code);
+            this.$el.append(pre);
+          }
+          window.Prism && Prism.highlightAllUnder(this.$el);
+        });
+    },
+  }));
+  // The rows a class inherits from one of its ancestors, shared by every page of its subclasses
+  Alpine.data('lazyRows', (url) => ({
+    open: false,
+    loaded: false,
+    toggle() {
+      this.open = !this.open;
+      if (this.loaded) {
+        return;
+      }
+      this.loaded = true;
+      fetch(url)
+        .then(response => response.text())
+        .then(html => {
+          this.$el.insertAdjacentHTML('beforeend', html);
+          window.Prism && Prism.highlightAllUnder(this.$el);
+        });
+    },
+  }));
+});
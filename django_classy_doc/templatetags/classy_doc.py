@@ -1,39 +1,46 @@
 from django import template
-from django.utils.text import capfirst
+from django.utils.safestring import mark_safe
+from django.utils.text import capfirst, slugify
 
 from django_classy_doc import settings as app_settings
+from django_classy_doc.matching import get_matcher
+from django_classy_doc.utils import defining_module
 
 register = template.Library()
 
+COMPACT_CHUNK_SIZE = 50
+
 
 @register.filter
 def class_from(value, arg):
-    from_map = app_settings.CLASSY_DOC_KNOWN_APPS
-
     try:
-        return any([value['defining_class'].__module__.startswith(f'{mod}.') for mod in from_map.get(arg, [])])
-    except AttributeError:
-        # it's a tuple not a string
-        return any([value['defining_class'][0].startswith(f'{mod}') for mod in from_map.get(arg, [])])
+        return get_matcher().owns(arg, defining_module(value))
     except Exception:
         return False
 
 
+def known_app(value):
+    try:
+        # precomputed by build_context
+        return value['known_app']
+    except KeyError:
+        return get_matcher().known_app(defining_module(value))
+
+
 @register.filter
 def display_if(value):
-    from_map = app_settings.CLASSY_DOC_KNOWN_APPS
+    name = known_app(value)
+    if name is None:
+        return 'true'
+    return f'show{capfirst(name)}'
 
-    try:
-        module_name = value['defining_class'].__module__
-    except AttributeError:
-        # it's a tuple not a string
-        module_name = value['defining_class'][0]
 
-    for name, mods in from_map.items():
-        if any([module_name.startswith(f'{mod}.') or module_name == mod for mod in mods]):
-            return f'show{capfirst(name)}'
-
-    return 'true'
+@register.filter
+def app_class(value):
+    name = known_app(value)
+    if name is None:
+        return ''
+    return f'app-{slugify(name)}'
 
 
 @register.simple_tag
@@ -43,16 +50,69 @@ def init_show_vars():
     return ', '.join([f'show{capfirst(app)}: false' for app in from_map.keys()])
 
 
+@register.simple_tag
+def hide_classes():
+    """The classes hiding the rows of every known app from a compact section, for its `:class` binding."""
+    return ', '.join([f"'hide-{slugify(app)}': !show{capfirst(app)}" for app in app_settings.CLASSY_DOC_KNOWN_APPS])
+
+
+@register.simple_tag
+def known_app_css():
+    return mark_safe('\n'.join([
+        f'.hide-{slugify(app)} .app-{slugify(app)} {{ display: none !important; }}'
+        for app in app_settings.CLASSY_DOC_KNOWN_APPS
+    ]))
+
+
 @register.filter
 def module(value):
-    return value['defining_class'].__module__
+    return value['defining_class'][0]
 
 
 @register.filter
 def class_name(value):
-    return value['defining_class'].__name__
+    return value['defining_class'][1]
 
 
 @register.filter
 def items(value, key):
     return value[key].items()
+
+
+@register.filter
+def chunks(value, key):
+    """The items of `value[key]` in chunks, which browsers don't render while they are off-screen."""
+    items = list(value[key].items())
+    return [items[i:i + COMPACT_CHUNK_SIZE] for i in range(0, len(items), COMPACT_CHUNK_SIZE)]
+
+
+@register.filter
+def overridden(declarations):
+    """The declarations overridden by the last one, closest first."""
+    return declarations[-2::-1]
+
+
+@register.filter
+def defining_name(value):
+    return '.'.join(value['defining_class'])
+
+
+@register.simple_tag
+def compact_rendering():
+    return app_settings.CLASSY_DOC_COMPACT
+
+
+@register.simple_tag
+def lazy_sources():
+    return app_settings.CLASSY_DOC_LAZY_SOURCE
+
+
+@register.simple_tag
+def server_highlighting():
+    return app_settings.CLASSY_DOC_HIGHLIGHT
+
+
+@register.simple_tag
+def highlight_css():
+    from django_classy_doc.highlighting import get_css
+    return get_css()
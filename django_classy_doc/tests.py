@@ -0,0 +1,1022 @@
+import gzip
+from http import client
+import importlib
+import inspect
+import io
+import json
+import linecache
+import os
+import pickle
+import re
+import sys
+import tempfile
+import threading
+from unittest import mock
+import zipfile
+
+from django.conf import settings
+from django.core.management import call_command
+from django.template.loader import get_template, render_to_string
+from django.test import SimpleTestCase, override_settings
+
+from . import settings as app_settings, warmup
+from .backends import DirectoryBackend, MemoryBackend
+from .cache import get_cache, get_cached_page
+from .discovery import imported_classes, resolve, static_classes
+from .export import FRAGMENT_MIN_SIZE, SCHEMA_VERSION, compact_html, extract_fragments, serialize_structure
+from .management.commands import classify
+from .highlighting import get_css
+from .manifest import MANIFEST_NAME, Manifest
+from .matching import get_matcher
+from .profiling import Profiler
+from .serving import DocsRequestHandler, accepts_gzip, make_server
+from .sources import get_index, getsourcelines
+from .utils import build_context, get_arguments, tf_methods
+from .watching import Watcher
+
+
+INCREMENTAL_MODULES = {
+    '__init__.py': '',
+    'base.py': 'class Base:\n    def run(self):\n        return 1\n',
+    'helpers.py': 'def helper(self):\n    return 2\n',
+    'models.py': (
+        'from .base import Base\nfrom .helpers import helper\n\n\n'
+        'class Child(Base):\n    helped = helper\n'
+    ),
+    'views.py': 'class Other:\n    def other(self):\n        return 3\n',
+}
+
+
+STATIC_MODULES = {
+    '__init__.py': (
+        'from .models import *\n'
+        'from .base import Base as Renamed, helper\n'
+        'from . import views\n'
+        'from django.views import View\n'
+    ),
+    'base.py': 'class Base:\n    pass\n\n\nclass _Private:\n    pass\n\n\ndef helper():\n    pass\n',
+    'models.py': (
+        'import sys\n\n'
+        "__all__ = ['Public', 'Fallback', 'Modern']\n\n\n"
+        'class Public:\n    pass\n\n\n'
+        'class _Hidden:\n    pass\n\n\n'
+        'try:\n    from json import missing\nexcept ImportError:\n    class Fallback:\n        pass\n\n'
+        'if sys.version_info >= (3,):\n    class Modern:\n        pass\nelse:\n    class Legacy:\n        pass\n\n'
+        'with open(__file__):\n    class Opened:\n        pass\n'
+    ),
+    'views.py': 'from .base import *\n',
+    'sub/__init__.py': 'from .deep import *\n',
+    'sub/deep.py': 'from ..base import Base\n\n\nclass Deep(Base):\n    pass\n\n\nclass _Private:\n    pass\n',
+    'sub/leaf.py': 'from .deep import Deep\n\n\nclass Leaf(Deep):\n    pass\n',
+}
+
+
+class StaticClassesTests(SimpleTestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        package = os.path.join(directory.name, 'classy_doc_static')
+        os.makedirs(os.path.join(package, 'sub'))
+        for name, source in STATIC_MODULES.items():
+            with open(os.path.join(package, name), 'w') as f:
+                f.write(source)
+        sys.path.insert(0, directory.name)
+        self.addCleanup(sys.path.remove, directory.name)
+        self.addCleanup(self.unload)
+
+    def unload(self):
+        for name in [name for name in sys.modules if name.startswith('classy_doc_static')]:
+            del sys.modules[name]
+
+    def test_conditional_blocks(self):
+        # Both branches of an if are parsed, only one is run
+        self.assertEqual(
+            static_classes('classy_doc_static.models'), ['Fallback', 'Legacy', 'Modern', 'Opened', 'Public', '_Hidden'],
+        )
+        self.assertEqual(
+            imported_classes('classy_doc_static.models'), ['Fallback', 'Modern', 'Opened', 'Public', '_Hidden'],
+        )
+
+    def test_star_imports(self):
+        # Star imports follow __all__, or skip private names; classes from outside the package are ignored
+        self.assertEqual(static_classes('classy_doc_static'), ['Fallback', 'Modern', 'Public', 'Renamed'])
+
+        self.assertEqual(static_classes('classy_doc_static.views'), [])
+        self.assertEqual(imported_classes('classy_doc_static.views'), [])
+
+    def test_relative_imports(self):
+        self.assertEqual(static_classes('classy_doc_static.sub'), ['Deep'])
+        self.assertEqual(imported_classes('classy_doc_static.sub'), ['Deep'])
+        self.assertEqual(static_classes('classy_doc_static.sub.deep'), ['Deep', '_Private'])
+
+        self.assertEqual(resolve('base', 2, 'classy_doc_static.sub.deep', False), 'classy_doc_static.base')
+        self.assertEqual(resolve('deep', 1, 'classy_doc_static.sub', True), 'classy_doc_static.sub.deep')
+        self.assertEqual(resolve(None, 1, 'classy_doc_static.sub', True), 'classy_doc_static.sub')
+        self.assertEqual(resolve('django.views', 0, 'classy_doc_static.sub', True), 'django.views')
+
+    def test_parses_rather_than_imports(self):
+        self.assertEqual(static_classes('classy_doc_static.sub.leaf'), ['Leaf'])
+        self.assertNotIn('classy_doc_static.sub.leaf', sys.modules)
+
+
+@override_settings(
+    CLASSY_DOC_BASES=['classy_doc_incremental'], CLASSY_DOC_NON_INSTALLED_APPS=['classy_doc_incremental'],
+)
+class IncrementalTests(SimpleTestCase):
+    klasses = ['classy_doc_incremental.models.Child', 'classy_doc_incremental.views.Other']
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.package = os.path.join(directory.name, 'classy_doc_incremental')
+        os.mkdir(self.package)
+        for name, source in INCREMENTAL_MODULES.items():
+            self.write(name, source)
+        self.output = os.path.join(directory.name, 'docs')
+        sys.path.insert(0, directory.name)
+        self.addCleanup(sys.path.remove, directory.name)
+        self.addCleanup(self.unload)
+
+    def unload(self):
+        for name in [name for name in sys.modules if name.startswith('classy_doc_incremental')]:
+            del sys.modules[name]
+
+    def write(self, name, source):
+        with open(os.path.join(self.package, name), 'w') as f:
+            f.write(source)
+
+    def classify(self):
+        """Run classify, returning the classes it rendered."""
+        with mock.patch.object(classify, 'render_klass', wraps=classify.render_klass) as render:
+            call_command('classify', *self.klasses, output=self.output, stdout=io.StringIO())
+        return {args[0] for args, _ in render.call_args_list}
+
+    def test_unchanged_pages_are_skipped(self):
+        self.assertEqual(self.classify(), set(self.klasses))
+        self.assertEqual(self.classify(), set())
+
+    def test_ancestor_change(self):
+        self.classify()
+        self.write('base.py', 'class Base:\n    def run(self):\n        return 10\n')
+        self.assertEqual(self.classify(), {'classy_doc_incremental.models.Child'})
+
+    def test_method_file_change(self):
+        self.classify()
+        self.write('helpers.py', 'def helper(self):\n    return 20\n')
+        self.assertEqual(self.classify(), {'classy_doc_incremental.models.Child'})
+
+    def test_template_change(self):
+        self.classify()
+        template = get_template('django_classy_doc/klass/methods.html').origin.name
+        file_hash = Manifest.file_hash
+
+        def changed_hash(manifest, filename):
+            return 'changed' if filename == template else file_hash(manifest, filename)
+
+        with mock.patch.object(Manifest, 'file_hash', changed_hash):
+            self.assertEqual(self.classify(), set(self.klasses))
+
+    def test_setting_change(self):
+        self.classify()
+        with override_settings(CLASSY_DOC_KNOWN_APPS={'django': ['django']}):
+            self.assertEqual(self.classify(), set(self.klasses))
+
+
+def documented_by_prefixes(klass, apps, bases, module_types, also_include, also_exclude):
+    """The checks build_context made before the Matcher."""
+    if klass in also_include:
+        return True
+    if klass in also_exclude:
+        return False
+    return (
+        any(klass.startswith(app) for app in apps)
+        and any(klass.startswith(base) for base in bases)
+        and any(f'.{mod_name}.' in klass for mod_name in module_types)
+    )
+
+
+def known_app_by_prefixes(module_name, known_apps):
+    """The lookup display_if made before the Matcher."""
+    for name, mods in known_apps.items():
+        if any(module_name.startswith(f'{mod}.') or module_name == mod for mod in mods):
+            return name
+    return None
+
+
+class AppSettingsTests(SimpleTestCase):
+
+    def test_cached_value_follows_override_settings(self):
+        self.assertIsNone(app_settings.CLASSY_DOC_CACHE)
+        self.assertIn('CLASSY_DOC_CACHE', vars(app_settings))
+
+        with override_settings(CLASSY_DOC_CACHE='default'):
+            self.assertNotIn('CLASSY_DOC_CACHE', vars(app_settings))
+            self.assertEqual(app_settings.CLASSY_DOC_CACHE, 'default')
+        self.assertNotIn('CLASSY_DOC_CACHE', vars(app_settings))
+        self.assertIsNone(app_settings.CLASSY_DOC_CACHE)
+
+    def test_other_values_are_kept(self):
+        app_settings.CLASSY_DOC_CACHE
+        with override_settings(CLASSY_DOC_COMPACT=True):
+            self.assertIn('CLASSY_DOC_CACHE', vars(app_settings))
+
+
+class MatcherTests(SimpleTestCase):
+    settings = [
+        {},
+        {'CLASSY_DOC_BASES': ['']},
+        {'CLASSY_DOC_BASES': ['sample', 'django.contrib.auth']},
+        {'CLASSY_DOC_BASES': ['sam']},
+        {'CLASSY_DOC_MODULE_TYPES': ['models', 'views.generic', 'forms']},
+        {'CLASSY_DOC_MODULE_TYPES': ['contrib.auth']},
+        {'CLASSY_DOC_NON_INSTALLED_APPS': ['external']},
+        {
+            'CLASSY_DOC_BASES': [''],
+            'CLASSY_DOC_ALSO_INCLUDE': ['sample.models.Category', 'external.lib.Thing'],
+            'CLASSY_DOC_ALSO_EXCLUDE': ['sample.models.Category', 'sample.models.Todo'],
+        },
+    ]
+    klasses = [
+        'sample.models.Category',
+        'sample.models.Todo',
+        'sample.views.TodoView',
+        'sample.models',
+        'samples.models.Other',
+        'sample.forms.models.Form',
+        'django.views.generic.base.View',
+        'django.views.generic.edit.CreateView',
+        'django.contrib.auth.models.User',
+        'django.contrib.auth.forms.UserCreationForm',
+        'external.models.Thing',
+        'external.lib.Thing',
+        'models.Thing',
+    ]
+    known_apps = {
+        'django': ['django'],
+        'auth': ['django.contrib.auth'],
+        'generic': ['django.views.generic', 'django.views'],
+        'forms': ['django.forms', 'django.contrib.auth.forms'],
+        'prefix': ['djan'],
+    }
+    modules = [
+        'django', 'django.views', 'django.views.generic.base', 'django.contrib.auth.forms', 'django.forms.models',
+        'djangoo.models', 'djan', 'sample.models', '',
+    ]
+
+    def test_is_documented(self):
+        for options in self.settings:
+            with override_settings(**options):
+                args = (
+                    list(settings.INSTALLED_APPS) + list(app_settings.CLASSY_DOC_NON_INSTALLED_APPS),
+                    app_settings.CLASSY_DOC_BASES, app_settings.CLASSY_DOC_MODULE_TYPES,
+                    app_settings.CLASSY_DOC_ALSO_INCLUDE, app_settings.CLASSY_DOC_ALSO_EXCLUDE,
+                )
+                for klass in self.klasses:
+                    with self.subTest(klass=klass, **options):
+                        self.assertEqual(get_matcher().is_documented(klass), documented_by_prefixes(klass, *args))
+
+    def test_known_app(self):
+        for known_apps in [{}, self.known_apps, dict(reversed(self.known_apps.items()))]:
+            with override_settings(CLASSY_DOC_KNOWN_APPS=known_apps):
+                for module_name in self.modules:
+                    with self.subTest(module_name=module_name, known_apps=list(known_apps)):
+                        self.assertEqual(
+                            get_matcher().known_app(module_name), known_app_by_prefixes(module_name, known_apps),
+                        )
+
+
+class BuildContextTests(SimpleTestCase):
+
+    def test_sys_path_does_not_grow(self):
+        build_context('sample.models.Category')
+        length = len(sys.path)
+        for _ in range(50):
+            build_context('sample.models.Category')
+            build_context('django_classy_doc.views.ClassyView')
+        self.assertEqual(len(sys.path), length)
+
+
+class DeclarationTests(SimpleTestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.filename = os.path.join(directory.name, 'classy_doc_declared.py')
+        with open(self.filename, 'w') as f:
+            f.write('class A:\n    def method(self):\n        return 1\n')
+        sys.path.insert(0, directory.name)
+        self.addCleanup(sys.path.remove, directory.name)
+        self.addCleanup(sys.modules.pop, 'classy_doc_declared', None)
+        self.A = importlib.import_module('classy_doc_declared').A
+
+    def declaration(self):
+        return tf_methods(('method', 'method', self.A, self.A.__dict__['method']))
+
+    def test_code_survives_source_changes(self):
+        declaration = self.declaration()
+        with open(self.filename, 'w') as f:
+            f.write('# header\n\nclass A:\n    def method(self):\n        return 2\n')
+        linecache.checkcache()
+        self.assertEqual(declaration.code, '    def method(self):\n        return 1\n')
+        self.assertEqual(declaration.lines, {'start': 2, 'total': 2})
+
+    def test_pickle(self):
+        declaration = self.declaration()
+        restored = pickle.loads(pickle.dumps(declaration))
+        self.assertEqual(restored.code, declaration.code)
+        self.assertEqual(restored.defining_class, ('classy_doc_declared', 'A'))
+        self.assertEqual(restored['arguments'], '(self)')
+
+
+INDEXED_MODULE = """\
+import functools
+
+
+def decorator(func):
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        return func(*args, **kwargs)
+    return wrapper
+
+
+class A:
+    @decorator
+    @functools.lru_cache(
+        maxsize=None,
+    )
+    def decorated(self):
+        return 1
+
+    def outer(self):
+        def inner():
+            return 2
+        return inner
+
+
+class B: method = lambda self: 3
+
+
+class C:
+    method = (
+        lambda self: 4
+    )
+"""
+
+
+class SourceIndexTests(SimpleTestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.filename = os.path.join(directory.name, 'classy_doc_indexed.py')
+        with open(self.filename, 'w') as f:
+            f.write(INDEXED_MODULE)
+        sys.path.insert(0, directory.name)
+        self.addCleanup(sys.path.remove, directory.name)
+        self.addCleanup(sys.modules.pop, 'classy_doc_indexed', None)
+        self.addCleanup(get_index.cache_clear)
+        self.module = importlib.import_module('classy_doc_indexed')
+
+    def sourcelines(self, func):
+        """Return the source and first line of `func`, checking them against inspect, and whether inspect was used."""
+        expected = inspect.getsourcelines(func)
+        with mock.patch('inspect.getsourcelines', wraps=inspect.getsourcelines) as fallback:
+            lines, start, filename = getsourcelines(func)
+        self.assertEqual((lines, start), expected)
+        self.assertEqual(filename, self.filename)
+        return ''.join(lines), start, fallback.called
+
+    def test_decorated_method(self):
+        self.assertEqual(self.sourcelines(self.module.A.decorated), (
+            '    @decorator\n    @functools.lru_cache(\n        maxsize=None,\n    )\n'
+            '    def decorated(self):\n        return 1\n', 12, False,
+        ))
+
+    def test_nested_def(self):
+        self.assertEqual(
+            self.sourcelines(self.module.A().outer()), ('        def inner():\n            return 2\n', 20, False),
+        )
+        self.assertEqual(self.sourcelines(self.module.decorator), (INDEXED_MODULE.split('\n\n\n')[1] + '\n', 4, False))
+
+    def test_class_and_method_on_the_same_line(self):
+        self.assertEqual(self.sourcelines(self.module.B.method), ('class B: method = lambda self: 3\n', 25, False))
+
+    def test_falls_back_to_inspect(self):
+        # Lambdas are not indexed
+        self.assertEqual(self.sourcelines(self.module.C.method), ('        lambda self: 4\n', 30, True))
+
+        # Neither are files that do not parse
+        get_index.cache_clear()
+        with mock.patch('linecache.getlines', return_value=['def broken(:\n']):
+            self.assertEqual(get_index(self.filename).blocks, {})
+        self.assertEqual(self.sourcelines(self.module.A.outer), (
+            '    def outer(self):\n        def inner():\n            return 2\n        return inner\n', 19, True,
+        ))
+
+
+class UnhashableCallable(dict):
+
+    def __call__(self, value):
+        return value
+
+
+class Unhashable:
+    """A class whose static method is an unhashable callable."""
+    method = staticmethod(UnhashableCallable())
+
+
+class GetArgumentsTests(SimpleTestCase):
+
+    def test_unhashable_callable(self):
+        self.assertEqual(get_arguments(UnhashableCallable()), '(value)')
+
+    @override_settings(CLASSY_DOC_ALSO_INCLUDE=['django_classy_doc.tests.Unhashable'])
+    def test_build_context_with_unhashable_method(self):
+        structure = build_context('django_classy_doc.tests.Unhashable', exit=False)
+        self.assertIn('method', structure['methods'])
+
+
+class WithProperty:
+
+    @property
+    def value(self):
+        return 1
+
+
+@override_settings(CLASSY_DOC_ALSO_INCLUDE=['django_classy_doc.tests.WithProperty'])
+class SignatureTests(SimpleTestCase):
+
+    def render(self):
+        structure = build_context('django_classy_doc.tests.WithProperty', exit=False)
+        return render_to_string('django_classy_doc/klass.html', {'klass': structure})
+
+    def test_property(self):
+        self.assertIn('@property\n  def value(self)', self.render())
+
+    @override_settings(CLASSY_DOC_COMPACT=True)
+    def test_compact_property(self):
+        self.assertIn('@property\n  def value(self)', self.render())
+
+
+@override_settings(CLASSY_DOC_LAZY_SOURCE=True)
+class SourceViewTests(SimpleTestCase):
+
+    def test_method_source(self):
+        response = self.client.get(
+            '/__doc__/django_classy_doc.views.ClassyView/django.views.generic.base.View/dispatch.json',
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('def dispatch', response.json()['code'])
+
+    def test_property_source(self):
+        response = self.client.get('/__doc__/sample.models.Care/django.db.models.base.Model/pk.json')
+        self.assertEqual(response.status_code, 200)
+
+    def test_only_methods(self):
+        for url in [
+            'django_classy_doc.views.ClassyView/django.views.generic.base.View/http_method_names.json',
+            'sample.models.ProductForm/sample.models.ProductForm/base_fields.json',
+        ]:
+            with self.subTest(url=url):
+                self.assertEqual(self.client.get(f'/__doc__/{url}').status_code, 404)
+
+
+LOCMEM_CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'pages'}}
+
+
+class PageCacheTests(SimpleTestCase):
+    url = '/__doc__/sample.models.Category.html'
+
+    def setUp(self):
+        from .views import ClassyView
+        patcher = mock.patch.object(ClassyView, 'render_page', autospec=True, side_effect=ClassyView.render_page)
+        self.render_page = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_etag(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('Last-Modified', response.headers)
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=response.headers['ETag'])
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(self.render_page.call_count, 2)
+
+    @override_settings(CACHES=LOCMEM_CACHES, CLASSY_DOC_CACHE='default')
+    def test_cache_hit(self):
+        get_cache().clear()
+        response = self.client.get(self.url)
+        self.assertIn('Last-Modified', response.headers)
+
+        response = self.client.get(self.url, HTTP_IF_MODIFIED_SINCE=response.headers['Last-Modified'])
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(self.client.get(self.url).status_code, 200)
+        self.assertEqual(self.render_page.call_count, 1)
+
+    @override_settings(CACHES=LOCMEM_CACHES, CLASSY_DOC_CACHE='default', CLASSY_DOC_CACHE_VERSION=1)
+    def test_cache_version(self):
+        get_cache().clear()
+        self.client.get(self.url)
+        self.assertIsNotNone(get_cached_page('klass:sample.models.Category'))
+        with override_settings(CLASSY_DOC_CACHE_VERSION=2):
+            self.assertIsNone(get_cached_page('klass:sample.models.Category'))
+            self.client.get(self.url)
+        self.assertEqual(self.render_page.call_count, 2)
+
+
+@override_settings(CLASSY_DOC_STREAMING=True, CLASSY_DOC_BASES=['sample'])
+class StreamingTests(SimpleTestCase):
+
+    def test_streams_documented_class(self):
+        response = self.client.get('/__doc__/sample.models.Category.html')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        self.assertIn(b'Category', b''.join(response.streaming_content))
+
+    def test_imported_class_outside_bases(self):
+        response = self.client.get('/__doc__/sample.models.MaxValueValidator.html')
+        self.assertEqual(response.status_code, 404)
+        self.assertFalse(response.streaming)
+
+
+class BackendTests(SimpleTestCase):
+
+    def classify(self, *args, **options):
+        call_command('classify', *args, stdout=io.StringIO(), **options)
+
+    def test_memory_backend(self):
+        backend = MemoryBackend()
+        self.classify('sample.models.Category', 'sample.models.Todo', backend=backend)
+        self.assertIn('sample.models.Category.html', backend.files)
+        self.assertIn('search/pages.json', backend.files)
+        self.assertIn(b'<title>Category</title>', backend.files['sample.models.Category.html'])
+
+    def test_zip_backend_streams_data_index(self):
+        with tempfile.TemporaryDirectory() as directory:
+            output = os.path.join(directory, 'docs')
+            self.classify('sample.models.Category', 'sample.models.Todo', output=output, backend='zip',
+                          format='json', gzip=True)
+            with zipfile.ZipFile(f'{output}.zip') as archive:
+                index = json.loads(archive.read('classify.json'))
+                self.assertIn('classify.json.gz', archive.namelist())
+            self.assertEqual([entry['path'] for entry in index['classes']],
+                             ['sample.models.Category', 'sample.models.Todo'])
+            self.assertEqual(os.listdir(directory), ['docs.zip'])
+
+    def versions(self, directory):
+        return sorted(name for name in os.listdir(directory) if name != 'docs')
+
+    def test_directory_backend_publish(self):
+        with tempfile.TemporaryDirectory() as directory:
+            output = os.path.join(directory, 'docs')
+            with DirectoryBackend(output) as backend:
+                backend.write('old.html', b'old')
+            first = self.versions(directory)
+            self.assertEqual(len(first), 1)
+            self.assertEqual(os.readlink(output), first[0])
+
+            with mock.patch('os.rename', wraps=os.rename) as rename, DirectoryBackend(output) as backend:
+                backend.write('new.html', b'new')
+            # The link is replaced at once, the output is never renamed away
+            rename.assert_not_called()
+            self.assertEqual(sorted(os.listdir(output)), ['new.html', 'old.html'])
+            second = self.versions(directory)
+            self.assertEqual(len(second), 1)
+            self.assertNotEqual(second, first)
+            self.assertEqual(os.readlink(output), second[0])
+
+    def test_directory_backend_failed_publish(self):
+        with tempfile.TemporaryDirectory() as directory:
+            output = os.path.join(directory, 'docs')
+            with DirectoryBackend(output) as backend:
+                backend.write('old.html', b'old')
+            versions = self.versions(directory)
+
+            backend = DirectoryBackend(output)
+            backend.open()
+            backend.write('new.html', b'new')
+            with mock.patch('os.replace', side_effect=OSError('replace failed')), self.assertRaises(OSError):
+                backend.close()
+            self.assertEqual(os.listdir(output), ['old.html'])
+            self.assertEqual(self.versions(directory), versions)
+
+    def test_directory_backend_replaces_a_directory(self):
+        with tempfile.TemporaryDirectory() as directory:
+            output = os.path.join(directory, 'docs')
+            os.mkdir(output)
+            with open(os.path.join(output, 'old.html'), 'wb') as f:
+                f.write(b'old')
+            with DirectoryBackend(output) as backend:
+                backend.write('new.html', b'new')
+            self.assertTrue(os.path.islink(output))
+            self.assertEqual(sorted(os.listdir(output)), ['new.html', 'old.html'])
+            self.assertEqual(len(self.versions(directory)), 1)
+
+    def test_directory_backend_without_symlinks(self):
+        with tempfile.TemporaryDirectory() as directory:
+            output = os.path.join(directory, 'docs')
+            with mock.patch('os.symlink', side_effect=OSError('not supported')):
+                for name in ['old.html', 'new.html']:
+                    with DirectoryBackend(output) as backend:
+                        backend.write(name, name.encode())
+            self.assertFalse(os.path.islink(output))
+            self.assertEqual(sorted(os.listdir(output)), ['new.html', 'old.html'])
+            self.assertEqual(os.listdir(directory), ['docs'])
+
+    def test_directory_backend_partial(self):
+        with tempfile.TemporaryDirectory() as directory:
+            output = os.path.join(directory, 'docs')
+            with DirectoryBackend(output) as backend:
+                for name in ['kept.html', 'changed.html', 'removed.html']:
+                    backend.write(name, b'old')
+            versions = self.versions(directory)
+
+            with mock.patch('os.link') as link, DirectoryBackend(output, partial=True) as backend:
+                backend.write('changed.html', b'new')
+                with backend.open_file('added.html') as f:
+                    f.write(b'new')
+                backend.remove('removed.html')
+            # Files are replaced one by one in the current version, the others are left alone
+            link.assert_not_called()
+            self.assertEqual(self.versions(directory), versions)
+            self.assertEqual(sorted(os.listdir(output)), ['added.html', 'changed.html', 'kept.html'])
+            with open(os.path.join(output, 'changed.html'), 'rb') as f:
+                self.assertEqual(f.read(), b'new')
+
+    def test_directory_backend_failed_partial_write(self):
+        with tempfile.TemporaryDirectory() as directory:
+            output = os.path.join(directory, 'docs')
+            with DirectoryBackend(output) as backend:
+                backend.write('page.html', b'old')
+
+            backend = DirectoryBackend(output, partial=True)
+            backend.open()
+            with self.assertRaises(ValueError), backend.open_file('page.html') as f:
+                f.write(b'partly')
+                raise ValueError
+            backend.abort()
+            self.assertEqual(os.listdir(output), ['page.html'])
+            with open(os.path.join(output, 'page.html'), 'rb') as f:
+                self.assertEqual(f.read(), b'old')
+
+    def test_directory_backend_failed_flush(self):
+        with tempfile.TemporaryDirectory() as directory:
+            output = os.path.join(directory, 'docs')
+            backend = DirectoryBackend(output)
+            backend.open()
+            backend.write('new.html', b'new')
+            with mock.patch.object(backend, 'flush', side_effect=OSError('disk full')), self.assertRaises(OSError):
+                backend.close()
+            self.assertEqual(os.listdir(directory), [])
+
+
+class HighlightingTests(SimpleTestCase):
+
+    def test_css_is_built_once_per_styles(self):
+        from pygments.formatters import HtmlFormatter
+
+        with override_settings(CLASSY_DOC_HIGHLIGHT_STYLES=('default', 'monokai')):
+            css = get_css()
+            with mock.patch('pygments.formatters.HtmlFormatter', wraps=HtmlFormatter) as formatter:
+                self.assertEqual(get_css(), css)
+            formatter.assert_not_called()
+
+        with override_settings(CLASSY_DOC_HIGHLIGHT_STYLES=('friendly', 'monokai')):
+            self.assertNotEqual(get_css(), css)
+
+    @override_settings(CLASSY_DOC_HIGHLIGHT=True)
+    def test_classify_writes_one_stylesheet(self):
+        with tempfile.TemporaryDirectory() as directory:
+            output = os.path.join(directory, 'docs')
+            call_command('classify', 'sample.models.Category', 'sample.models.Todo', output=output,
+                         stdout=io.StringIO())
+            with open(os.path.join(output, 'assets', 'highlight.css')) as f:
+                self.assertEqual(f.read(), get_css())
+            for page in ['classify.html', 'sample.models.Todo.html']:
+                with open(os.path.join(output, page)) as f:
+                    page = f.read()
+                self.assertIn('<link rel="stylesheet" href="assets/highlight.css">', page)
+                self.assertNotIn('.highlight', page)
+
+
+class ProfilerTests(SimpleTestCase):
+
+    def test_blocks_per_class_and_module(self):
+        profiler = Profiler()
+        kept = []
+        with profiler.phase('classify', 'app.models.Big'):
+            kept.append([object() for _ in range(1000)])
+        with profiler.phase('import', module='app.views'):
+            pass
+
+        self.assertGreaterEqual(profiler.klasses['app.models.Big']['blocks'], 1000)
+        self.assertEqual(profiler.modules['app.models']['blocks'], profiler.klasses['app.models.Big']['blocks'])
+        self.assertEqual(profiler.phases['classify']['blocks'], profiler.klasses['app.models.Big']['blocks'])
+        self.assertIn('app.views', profiler.modules)
+
+        report = profiler.report()
+        blocks = profiler.klasses['app.models.Big']['blocks']
+        self.assertRegex(report, rf'\d+\.\d{{4}}\s+{blocks}  app\.models\.Big')
+
+
+class WarmUpTests(SimpleTestCase):
+
+    def should_warm_up(self, argv, environ=None):
+        with mock.patch.object(sys, 'argv', argv), mock.patch.dict(os.environ, environ or {}, clear=True):
+            return warmup.should_warm_up()
+
+    def test_runserver(self):
+        self.assertTrue(self.should_warm_up(['manage.py', 'runserver'], {'RUN_MAIN': 'true'}))
+        self.assertTrue(self.should_warm_up(['manage.py', 'runserver', '--noreload']))
+        # The autoreloader
+        self.assertFalse(self.should_warm_up(['manage.py', 'runserver']))
+
+    def test_other_processes(self):
+        for command in ['migrate', 'test', 'shell', 'collectstatic', 'classify']:
+            with self.subTest(command=command):
+                self.assertFalse(self.should_warm_up(['manage.py', command]))
+                self.assertFalse(self.should_warm_up(['/venv/lib/django/__main__.py', command]))
+
+        for argv in [
+            ['/venv/bin/pytest', 'tests'],
+            ['/venv/lib/pytest/__main__.py'],
+            ['/venv/bin/celery', '-A', 'project', 'worker'],
+            ['/venv/bin/ipython'],
+            ['scripts/nightly.py', 'runserver'],
+            [''],
+            # WSGI and ASGI servers call start_warm_up themselves
+            ['/venv/bin/gunicorn', 'wsgi'],
+        ]:
+            with self.subTest(argv=argv):
+                self.assertFalse(self.should_warm_up(argv))
+
+    def test_start_warm_up(self):
+        self.addCleanup(setattr, warmup, '_started', None)
+        with mock.patch.object(warmup, 'warm_up') as warm_up:
+            with override_settings(CLASSY_DOC_WARMUP=False):
+                self.assertIsNone(warmup.start_warm_up())
+            with override_settings(CLASSY_DOC_WARMUP=True):
+                thread = warmup.start_warm_up()
+                self.assertIs(warmup.start_warm_up(), thread)
+            thread.join()
+        warm_up.assert_called_once_with()
+
+    @override_settings(
+        CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'warmup'}},
+        CLASSY_DOC_CACHE='default',
+        CLASSY_DOC_BASES=['sample'],
+    )
+    def test_warm_up(self):
+        discover = mock.Mock(wraps=warmup.build_list_of_documentables)
+        with mock.patch.object(warmup, 'build_list_of_documentables', discover), \
+                mock.patch('django_classy_doc.views.build_list_of_documentables', discover), \
+                mock.patch('sys.stdout', io.StringIO()):
+            warmup.warm_up(concurrency=2)
+        self.assertEqual(discover.call_count, 1)
+        self.assertIsNotNone(get_cached_page('index'))
+        self.assertIsNotNone(get_cached_page('klass:sample.models.Category'))
+
+
+class ServingTests(SimpleTestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        with open(os.path.join(directory.name, 'page.html'), 'w') as f:
+            f.write('<html>page</html>')
+        with open(os.path.join(directory.name, 'page.html.gz'), 'wb') as f:
+            f.write(gzip.compress(b'<html>page</html>'))
+
+        patcher = mock.patch.object(DocsRequestHandler, 'log_message')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        httpd = make_server(0, directory.name)
+        threading.Thread(target=httpd.serve_forever, kwargs={'poll_interval': 0.01}, daemon=True).start()
+        self.addCleanup(httpd.server_close)
+        self.addCleanup(httpd.shutdown)
+        self.port = httpd.server_address[1]
+
+    def get(self, path='/page.html', **headers):
+        connection = client.HTTPConnection('127.0.0.1', self.port)
+        self.addCleanup(connection.close)
+        connection.request('GET', path, headers=headers)
+        response = connection.getresponse()
+        return response, response.read()
+
+    def test_accepts_gzip(self):
+        for header, accepted in [
+            ('', False),
+            ('gzip', True),
+            ('deflate, gzip;q=0.5', True),
+            ('gzip;q=0', False),
+            ('gzip; q=0.0', False),
+            ('*', True),
+            ('*;q=0', False),
+            ('*;q=1, gzip;q=0', False),
+            ('gzip;q=0.1, *;q=0', True),
+            ('identity', False),
+            ('gzip;q=high', False),
+        ]:
+            with self.subTest(header=header):
+                self.assertEqual(accepts_gzip(header), accepted)
+
+    def test_gzip(self):
+        response, body = self.get(**{'Accept-Encoding': 'gzip'})
+        self.assertEqual(response.status, 200)
+        self.assertEqual(response.getheader('Content-Encoding'), 'gzip')
+        self.assertEqual(response.getheader('Content-Type'), 'text/html')
+        self.assertEqual(response.getheader('Vary'), 'Accept-Encoding')
+        self.assertEqual(gzip.decompress(body), b'<html>page</html>')
+
+        response, body = self.get(**{'Accept-Encoding': 'gzip;q=0'})
+        self.assertIsNone(response.getheader('Content-Encoding'))
+        self.assertEqual(response.getheader('Vary'), 'Accept-Encoding')
+        self.assertEqual(body, b'<html>page</html>')
+        self.assertNotEqual(response.getheader('ETag'), self.get(**{'Accept-Encoding': 'gzip'})[0].getheader('ETag'))
+
+    def test_if_none_match(self):
+        etag = self.get()[0].getheader('ETag')
+        response, body = self.get(**{'If-None-Match': f'"other", {etag}'})
+        self.assertEqual(response.status, 304)
+        self.assertEqual(body, b'')
+        self.assertEqual(response.getheader('ETag'), etag)
+        self.assertEqual(response.getheader('Vary'), 'Accept-Encoding')
+
+        self.assertEqual(self.get(**{'If-None-Match': '"other"'})[0].status, 200)
+        # The gzipped file has its own tag
+        self.assertEqual(self.get(**{'If-None-Match': etag, 'Accept-Encoding': 'gzip'})[0].status, 200)
+
+    def test_if_modified_since(self):
+        last_modified = self.get()[0].getheader('Last-Modified')
+        response, body = self.get(**{'If-Modified-Since': last_modified})
+        self.assertEqual(response.status, 304)
+        self.assertEqual(response.getheader('Vary'), 'Accept-Encoding')
+
+        self.assertEqual(self.get(**{'If-Modified-Since': 'Thu, 01 Jan 1970 00:00:00 GMT'})[0].status, 200)
+        self.assertEqual(self.get(**{'If-Modified-Since': 'yesterday'})[0].status, 200)
+        # If-None-Match takes precedence
+        self.assertEqual(self.get(**{'If-Modified-Since': last_modified, 'If-None-Match': '"other"'})[0].status, 200)
+
+    def test_missing_file(self):
+        self.assertEqual(self.get('/missing.html')[0].status, 404)
+
+
+class SearchIndexTests(SimpleTestCase):
+
+    def test_partial_run_updates_search_index(self):
+        with tempfile.TemporaryDirectory() as directory:
+            output = os.path.join(directory, 'docs')
+            call_command('classify', 'sample.models.Category', 'sample.models.Todo', output=output,
+                         stdout=io.StringIO())
+            call_command('classify', 'sample.models.Product', output=output, partial=True, stdout=io.StringIO())
+
+            with open(os.path.join(output, 'search', 'pages.json')) as f:
+                pages = dict(json.load(f))
+            self.assertEqual(set(pages.values()), {
+                'sample.models.Category', 'sample.models.Todo', 'sample.models.Product',
+            })
+            with open(os.path.join(output, 'search', 'p.json')) as f:
+                self.assertIn('sample.models.Product', [entry[2] for entry in json.load(f)])
+
+
+class ExportTests(SimpleTestCase):
+
+    def test_serialize_structure(self):
+        data = serialize_structure(build_context('sample.models.Product'))
+        self.assertEqual(json.loads(json.dumps(data)), data)
+        self.assertEqual(data['schema'], SCHEMA_VERSION)
+        self.assertEqual((data['module'], data['name']), ('sample.models', 'Product'))
+        self.assertIn(['django.db.models.base', 'Model'], data['ancestors'])
+        self.assertEqual(data['parents'], [['django.db.models.base', 'Model']])
+
+        category = data['fields']['category'][-1]
+        self.assertEqual(category['field_type'], 'ForeignKey')
+        self.assertEqual(category['defining_class'], ['sample.models', 'Product'])
+
+        save = data['methods']['save'][-1]
+        self.assertEqual(save['defining_class'], ['django.db.models.base', 'Model'])
+        self.assertIn('def save(', save['code'])
+        self.assertEqual(save['lines']['total'], save['code'].count('\n'))
+        self.assertEqual(data['meta'], {'ordering': ['name']})
+
+    def test_json_format(self):
+        backend = MemoryBackend()
+        call_command('classify', 'sample.models.Category', 'sample.models.Product', format='json', backend=backend,
+                     stdout=io.StringIO())
+        index = json.loads(backend.files['classify.json'])
+        self.assertEqual(index['schema'], SCHEMA_VERSION)
+        self.assertEqual(
+            [entry['path'] for entry in index['classes']], ['sample.models.Category', 'sample.models.Product'],
+        )
+        page = json.loads(backend.files['sample.models.Product.json'])
+        self.assertEqual(page, serialize_structure(build_context('sample.models.Product')))
+
+
+class FragmentsTests(SimpleTestCase):
+
+    def test_short_sources_stay_inline(self):
+        short = {'docstring': None, 'code': 'def f(self):\n    pass\n', 'lines': {'start': 1, 'total': 2}}
+        long = {'docstring': 'Long.', 'code': 'x' * FRAGMENT_MIN_SIZE, 'lines': {'start': 1, 'total': 1}}
+        fragments = extract_fragments({'methods': {'short': [short], 'long': [long]}})
+
+        self.assertEqual(len(fragments), 1)
+        self.assertNotIn('source_url', short)
+        self.assertEqual(short['code'], 'def f(self):\n    pass\n')
+        self.assertNotIn('code', long)
+        self.assertEqual(long['source_url'], f'fragments/{next(iter(fragments))}')
+        self.assertTrue(next(iter(fragments)).endswith('.json'))
+
+    def test_compact_html_keeps_preformatted_text(self):
+        html = '<div>\n  <pre>  a\n    b\n</pre>\n  <span>x</span>\n</div>\n<script>\n  f();\n</script>'
+        self.assertEqual(
+            compact_html(html), '<div><pre>  a\n    b\n</pre><span>x</span></div><script>\n  f();\n</script>',
+        )
+
+    def test_inherited_rows_are_fragments(self):
+        with tempfile.TemporaryDirectory() as directory:
+            output = os.path.join(directory, 'docs')
+            call_command('classify', 'sample.models.Todo', output=output, fragments=True, stdout=io.StringIO())
+            with open(os.path.join(output, 'classify.html')) as f:
+                page = f.read()
+            self.assertIn('<script src="assets/lazy.js"></script>', page)
+            self.assertTrue(os.path.exists(os.path.join(output, 'assets', 'lazy.js')))
+
+            urls = re.findall(r"lazyRows\('(fragments/[0-9a-f]+\.html)'\)", page)
+            self.assertTrue(urls)
+            # Methods inherited from Model are not on the page, only in the fragment loaded on demand
+            self.assertNotIn('def save(', page)
+            fragments = ''
+            for url in urls:
+                with open(os.path.join(output, url)) as f:
+                    fragments += f.read()
+            self.assertIn('def save(', fragments)
+
+    def test_lazy_assets_only_with_fragments(self):
+        with tempfile.TemporaryDirectory() as directory:
+            output = os.path.join(directory, 'docs')
+            call_command('classify', 'sample.models.Todo', output=output, stdout=io.StringIO())
+            with open(os.path.join(output, 'classify.html')) as f:
+                page = f.read()
+            self.assertNotIn('lazyRows', page)
+            self.assertNotIn('lazy.js', page)
+            self.assertNotIn('lazy-docstring', page)
+
+    def test_unused_fragments_are_pruned(self):
+        with tempfile.TemporaryDirectory() as directory:
+            output = os.path.join(directory, 'docs')
+            call_command('classify', 'sample.models.Category', 'sample.models.Todo', output=output,
+                         fragments=True, stdout=io.StringIO())
+            self.assertTrue(os.listdir(os.path.join(output, 'fragments')))
+            with open(os.path.join(output, 'sample.models.Todo.html')) as f:
+                self.assertIn('lazyRows(', f.read())
+
+            call_command('classify', 'sample.models.Category', 'sample.models.Todo', output=output,
+                         stdout=io.StringIO())
+            self.assertFalse(os.path.exists(os.path.join(output, 'fragments')))
+
+
+class WatchTests(SimpleTestCase):
+
+    def setUp(self):
+        from .management.commands.classify import Command
+        self.stderr = io.StringIO()
+        self.command = Command(stdout=io.StringIO(), stderr=self.stderr)
+        self.options = {'output': 'output', 'format': 'html', 'jobs': 1, 'fragments': False, 'gzip': False}
+
+    def test_affected_pages_of_the_watched_format(self):
+        import sample.models
+
+        with tempfile.TemporaryDirectory() as directory:
+            output = os.path.join(directory, 'docs')
+            for output_format in ['html', 'json']:
+                call_command('classify', 'sample.models.Category', 'sample.models.Todo', output=output,
+                             format=output_format, stdout=io.StringIO())
+            manifest = Manifest.load(os.path.join(output, MANIFEST_NAME))
+
+        filename = os.path.abspath(sample.models.__file__)
+        self.assertEqual(Watcher(manifest, 'json').index.affected([filename]), {
+            'sample.models.Category.json': 'sample.models.Category',
+            'sample.models.Todo.json': 'sample.models.Todo',
+        })
+        self.assertEqual(set(Watcher(manifest, 'html').index.affected([filename])), {
+            'sample.models.Category.html', 'sample.models.Todo.html',
+        })
+
+    def test_rebuild_reinvokes_the_script(self):
+        with mock.patch.object(sys, 'argv', ['../project/manage.py', 'classify', '--watch']):
+            args = self.command.rebuild_args(self.options, {'sample.models.Todo'})
+        self.assertEqual(args[:3], [sys.executable, os.path.abspath('../project/manage.py'), 'classify'])
+        self.assertEqual(args[-1], 'sample.models.Todo')
+
+        with mock.patch.object(sys, 'argv', ['/venv/lib/django/__main__.py', 'classify', '--watch']):
+            args = self.command.rebuild_args(self.options, {'sample.models.Todo'})
+        self.assertEqual(args[:4], [sys.executable, '-m', 'django', 'classify'])
+
+    def test_failed_rebuild(self):
+        pages = {'sample.models.Todo.html': 'sample.models.Todo'}
+        with mock.patch('subprocess.run', return_value=mock.Mock(returncode=1)):
+            self.assertFalse(self.command.rebuild(self.options, pages))
+        self.assertIn('Rebuilding failed with exit status 1', self.stderr.getvalue())
+        with mock.patch('subprocess.run', return_value=mock.Mock(returncode=0)):
+            self.assertTrue(self.command.rebuild(self.options, pages))
@@ -1,9 +1,10 @@
 from django.urls import path
 
-from .views import ClassyView, ClassyIndexView
+from .views import ClassyView, ClassyIndexView, ClassySourceView
 
 
 urlpatterns = [
+    path('<str:klass>/<str:defining>/<str:name>.json', ClassySourceView.as_view()),
     path('<str:klass>.html', ClassyView.as_view()),
     path('classify.html', ClassyIndexView.as_view()),
     path('', ClassyIndexView.as_view()),
@@ -4,19 +4,20 @@ from copy import copy
 import inspect
 import pydoc
 import sys
+import threading
 
 from django.conf import settings
 from django.db.models import Model
 from django.forms.models import ModelForm
 from django.forms.forms import BaseForm
-from django.utils.module_loading import import_string
 from django.utils.html import escape
 
 from . import settings as app_settings
-
-
-if not hasattr(inspect, 'getargspec'):
-    inspect.getargspec = inspect.getfullargspec
+from .declarations import Declaration
+from .discovery import imported_classes, static_classes
+from .matching import get_matcher
+from .profiling import phase
+from .sources import getsourcelines
 
 
 class DefaultOrderedDict(OrderedDict):
@@ -30,6 +31,40 @@ class DefaultOrderedDict(OrderedDict):
         self[key] = value
         return value
 
+    def __reduce__(self):
+        return type(self), (self.default_factory,), None, None, iter(self.items())
+
+
+class LRUCache(OrderedDict):
+    """An ``OrderedDict`` holding at most ``maxsize`` entries, evicting the least recently used one."""
+
+    def __init__(self, maxsize=128, *args, **kwargs):
+        self.maxsize = maxsize
+        # Pages can be built by several threads, serving requests or warming the cache up
+        self.lock = threading.RLock()
+        super().__init__(*args, **kwargs)
+
+    def __getitem__(self, key):
+        with self.lock:
+            value = super().__getitem__(key)
+            self.move_to_end(key)
+            return value
+
+    def __setitem__(self, key, value):
+        with self.lock:
+            super().__setitem__(key, value)
+            self.move_to_end(key)
+            if len(self) > self.maxsize:
+                self.popitem(last=False)
+
+
+def defining_module(declaration):
+    try:
+        return declaration['defining_class'].__module__
+    except AttributeError:
+        # it's a tuple not a class
+        return declaration['defining_class'][0]
+
 
 def get_attrs(obj):
     all_attrs = filter(lambda data: pydoc.visiblename(data[0], obj=obj),
@@ -37,39 +72,65 @@ def get_attrs(obj):
     return filter(lambda data: data[2] == obj, all_attrs)
 
 
+_signatures = LRUCache(4096)
+
+
+def get_arguments(func):
+    """Memoized formatted signature of a function, `None` for callables without one."""
+    if isinstance(func, (classmethod, staticmethod)) or inspect.ismethod(func):
+        # Like for plain methods, keep `cls` in the arguments of class methods
+        func = func.__func__
+
+    try:
+        return _signatures[func]
+    except KeyError:
+        pass
+    except TypeError:
+        # Unhashable callables can't be memoized
+        return format_signature(func)
+
+    arguments = format_signature(func)
+    _signatures[func] = arguments
+    return arguments
+
+
+def format_signature(func):
+    try:
+        return str(inspect.signature(func))
+    except (TypeError, ValueError):
+        return None
+
+
+def class_names(cls):
+    return (cls.__module__, cls.__name__)
+
+
 def tf_attributes(attr):
-    return {
-        'name': attr[0],
-        'type': attr[1],
-        'object': escape(getattr(attr[2], attr[0])),
-        'defining_class': attr[2]
-    }
+    return Declaration(
+        attr[0], attr[1], class_names(attr[2]),
+        object=escape(getattr(attr[2], attr[0])),
+    )
 
 
-def tf_methods(attr):
+def tf_methods(attr, source=True):
+    """Transform a method, without reading its source when `source` is False."""
     arguments = None
     lines = []
     start_line = 0
-    source = None
+    filename = None
 
     try:
         func = getattr(attr[2], attr[0])
         docstring = pydoc.getdoc(attr[3])
 
         # Get the attr arguments
-        try:
-            args, varargs, keywords, defaults = inspect.getargspec(func)
-            arguments = inspect.formatargspec(args, varargs=varargs, varkw=keywords, defaults=defaults)
-        except TypeError:
-            pass
-        except ValueError:
-            # ToDo: use inspect.signature() instead of inspect.getargspec()
-            pass
+        arguments = get_arguments(func)
 
         # Get source line details
         try:
-            lines, start_line = inspect.getsourcelines(func)
-            source = inspect.getsourcefile(func)
+            if source:
+                with phase('source'):
+                    lines, start_line, filename = getsourcelines(func)
         except TypeError:
             pass
         except OSError:
@@ -78,24 +139,19 @@ def tf_methods(attr):
     except AttributeError as e:
         docstring = f'{e}'
 
-    return {
-        'name': attr[0],
-        'type': attr[1],
-        'docstring': docstring,
-        'defining_class': attr[2],
-        'arguments': arguments,
-        'code': ''.join(lines),
-        'lines': {'start': start_line, 'total': len(lines)},
-        'file': source
-    }
+    return Declaration(
+        attr[0], attr[1], class_names(attr[2]),
+        docstring=docstring,
+        arguments=arguments,
+        code=tuple(lines),
+        start=start_line,
+        total=len(lines),
+        file=filename,
+    )
 
 
 def tf_everything(attr):
-    return {
-        'name': attr[0],
-        'type': attr[1],
-        'rest': attr
-    }
+    return Declaration(attr[0], attr[1], class_names(attr[2]))
 
 
 def tf_fields(attr):
@@ -117,16 +173,64 @@ def tf_fields(attr):
             # Not a relationship
             field_class = attr[3].field.__class__
 
-    return {
-        'name': attr[0],
-        'type': attr[1],
-        'defining_class': (attr[2].__module__, attr[2].__name__),
-        'field_type': field_class.__name__,
-        'related': related,
-    }
+    return Declaration(
+        attr[0], attr[1], class_names(attr[2]),
+        field_type=field_class.__name__,
+        related=related,
+    )
+
+
+def classify_own_attributes(cls, source=True):
+    """Yield ``(target, name, declaration)`` for every attribute ``cls`` defines itself."""
+    for attribute in get_attrs(cls):
+
+        if attribute[0] == 'Meta':
+            continue
+
+        if attribute[1] == 'data':
+            target = 'attributes'
+        elif (
+            attribute[1] in ['method', 'class method', 'static method'] or attribute[1].endswith('property')
+        ) and getattr(attribute[3], '__class__', type).__name__ != "DeferredAttribute":
+            target = 'methods'
+        elif attribute[1] == 'data descriptor' \
+                or getattr(attribute[3], '__class__', type).__name__ == "DeferredAttribute":
+            if attribute[3].__class__.__name__ == 'ReverseOneToOneDescriptor' and attribute[2].__name__ == 'Page':
+                continue
+            target = 'fields'
+        else:
+            target = 'everything'
+
+        tf = globals()[f'tf_{target}']
+        tf_ed = tf(attribute, source) if target == 'methods' else tf(attribute)
+        yield target, tf_ed.name, tf_ed
 
+    if issubclass(cls, BaseForm) and hasattr(cls, 'declared_fields'):
+        for field, field_type in cls.declared_fields.items():
+            yield 'fields', field, Declaration(
+                field, None, class_names(cls),
+                field_type=field_type.__class__.__name__,
+            )
 
-def classify(klass, obj, name=None, mod=None, *ignored):
+
+_own_attributes = None
+
+
+def get_own_attributes(cls, source=True):
+    """Memoized ``classify_own_attributes``, callers must copy declarations before altering them."""
+    global _own_attributes
+    if _own_attributes is None:
+        _own_attributes = LRUCache(app_settings.CLASSY_DOC_CLASSIFY_CACHE_SIZE)
+
+    try:
+        return _own_attributes[cls, source]
+    except KeyError:
+        records = tuple(classify_own_attributes(cls, source))
+        _own_attributes[cls, source] = records
+        return records
+
+
+def classify(klass, obj, name=None, mod=None, *ignored, source=True):
     if not inspect.isclass(obj):
         raise Exception
 
@@ -144,37 +248,8 @@ def classify(klass, obj, name=None, mod=None, *ignored):
         if cls is builtins.object:
             continue
 
-        for attribute in get_attrs(cls):
-
-            if attribute[0] == 'Meta':
-                continue
-
-            if attribute[1] == 'data':
-                target = 'attributes'
-            elif (
-                attribute[1] in ['method', 'class method', 'static method'] or attribute[1].endswith('property')
-            ) and getattr(attribute[3], '__class__', type).__name__ != "DeferredAttribute":
-                target = 'methods'
-            elif attribute[1] == 'data descriptor' \
-                    or getattr(attribute[3], '__class__', type).__name__ == "DeferredAttribute":
-                if attribute[3].__class__.__name__ == 'ReverseOneToOneDescriptor' and attribute[2].__name__ == 'Page':
-                    continue
-                target = 'fields'
-            else:
-                target = 'everything'
-
-            tf = globals()[f'tf_{target}']
-            tf_ed = tf(attribute)
-            name = tf_ed.pop('name')
-            klass[target][name].append(tf_ed)
-
-        if issubclass(cls, BaseForm) and hasattr(cls, 'declared_fields'):
-            for field, field_type in cls.declared_fields.items():
-                klass['fields'][field].append({
-                    'name': field,
-                    'field_type': field_type.__class__.__name__,
-                    'defining_class': (cls.__module__, cls.__name__)
-                })
+        for target, name, declaration in get_own_attributes(cls, source):
+            klass[target][name].append(declaration.copy())
 
     if issubclass(obj, Model):
         klass['Meta'] = obj._meta.original_attrs
@@ -188,18 +263,23 @@ def classify(klass, obj, name=None, mod=None, *ignored):
         for field, field_type in cls.base_fields.items():
             if field in klass['fields']:
                 continue
-            klass['fields'][field].append({
-                'name': field,
-                'field_type': field_type.__class__.__name__,
-                'defining_class': ('Auto', '')
-            })
+            klass['fields'][field].append(Declaration(
+                field, None, ('Auto', ''),
+                field_type=field_type.__class__.__name__,
+            ))
 
     return klass
 
 
-def build(thing):
+def setup_path():
+    """Make modules importable from the current directory, only once per process."""
+    if '' not in sys.path:
+        sys.path.insert(0, '')
+
+
+def build(thing, source=True):
     """Build a dictionary mapping of a class."""
-    sys.path.insert(0, '')
+    setup_path()
 
     klass = {
         'attributes': DefaultOrderedDict(list),
@@ -213,34 +293,20 @@ def build(thing):
 
     obj, name = pydoc.resolve(thing, forceload=0)
 
-    if not any(
-        [obj.__module__.startswith(base) for base in app_settings.CLASSY_DOC_BASES]
-    ) and f'{obj.__module__}.{obj.__name__}' not in app_settings.CLASSY_DOC_ALSO_INCLUDE:
+    matcher = get_matcher()
+    if not matcher.is_base(obj.__module__) and f'{obj.__module__}.{obj.__name__}' not in matcher.also_include:
         return False
 
-    return classify(klass, obj, name)
+    return classify(klass, obj, name, source=source)
 
 
-def build_context(klass, exit=True):
-    is_documented = False
-    if klass in app_settings.CLASSY_DOC_ALSO_INCLUDE:
-        is_documented = True
-    elif klass not in app_settings.CLASSY_DOC_ALSO_EXCLUDE:
-        if not any([
-            klass.startswith(app)
-            for app in settings.INSTALLED_APPS + app_settings.CLASSY_DOC_NON_INSTALLED_APPS
-        ]):
-            return False
-        if not any([klass.startswith(base) for base in app_settings.CLASSY_DOC_BASES]):
-            return False
-        if not any([f'.{mod_name}.' in klass for mod_name in app_settings.CLASSY_DOC_MODULE_TYPES]):
-            return False
-        is_documented = True
-    if not is_documented:
+def build_context(klass, exit=True, source=True):
+    if not get_matcher().is_documented(klass):
         return False
 
     try:
-        structure = build(klass)
+        with phase('classify', klass):
+            structure = build(klass, source)
         if structure is False:
             return False
 
@@ -252,9 +318,6 @@ def build_context(klass, exit=True):
 
     for name, lst in structure['attributes'].items():
         for i, definition in enumerate(lst):
-            a = definition['defining_class']
-            structure['attributes'][name][i]['defining_class'] = (a.__module__, a.__name__)
-
             if isinstance(definition['object'], list):
                 try:
                     s = '[{0}]'.format(', '.join([c.__name__ for c in definition['object']]))
@@ -264,6 +327,16 @@ def build_context(klass, exit=True):
                     structure['attributes'][name][i]['default'] = s
                     continue
 
+    matcher = get_matcher()
+    for target in ['attributes', 'methods', 'fields']:
+        for lst in structure[target].values():
+            for definition in lst:
+                definition['known_app'] = matcher.known_app(defining_module(definition))
+
+    if app_settings.CLASSY_DOC_HIGHLIGHT:
+        from .highlighting import highlight_structure
+        highlight_structure(structure)
+
     sorted_attributes = sorted(structure['attributes'].items(), key=lambda t: t[0])
     structure['attributes'] = OrderedDict(sorted_attributes)
 
@@ -273,35 +346,44 @@ def build_context(klass, exit=True):
     return structure
 
 
+def get_method_source(cls, name):
+    """Return the docstring and source of the method `name` defined by `cls`."""
+    declaration = tf_methods((name, None, cls, cls.__dict__[name]))
+    source = {key: declaration[key] for key in ['docstring', 'code', 'lines']}
+    if app_settings.CLASSY_DOC_HIGHLIGHT and source['code']:
+        from .highlighting import highlight
+        source['code_html'] = highlight(source['code'])
+    return source
+
+
 def build_list_of_documentables(apps=None):
     if apps is None:
         apps = defaultdict(lambda: defaultdict(list))
     klasses = copy(app_settings.CLASSY_DOC_ALSO_INCLUDE)
 
+    matcher = get_matcher()
+
     for app in list(settings.INSTALLED_APPS) + list(app_settings.CLASSY_DOC_NON_INSTALLED_APPS):
-        if not any([app.startswith(base) for base in app_settings.CLASSY_DOC_BASES]):
+        if not matcher.is_base(app):
             continue
 
         for mod_name in app_settings.CLASSY_DOC_MODULE_TYPES:
             mod_string = f'{app}.{mod_name}'
             print(f'Trying {mod_string}')
-            found = False
-            for mods in app_settings.CLASSY_DOC_KNOWN_APPS.values():
-                if any([f'{mod_string}.'.startswith(f'{mod}.') for mod in mods]):
-                    found = True
-                    break
-            if found:
+            if matcher.known_app(mod_string) is not None:
                 continue
 
             try:
-                module = import_string(mod_string)
-                for name, obj in inspect.getmembers(module):
-                    if not inspect.isclass(obj) or not obj.__module__.startswith(f'{app}.{mod_name}'):
-                        continue
-
+                if app_settings.CLASSY_DOC_DISCOVERY == 'static':
+                    with phase('parse', module=mod_string):
+                        names = static_classes(mod_string)
+                else:
+                    with phase('import', module=mod_string):
+                        names = imported_classes(mod_string)
+                for name in names:
                     full_name = f'{app}.{mod_name}.{name}'
 
-                    if full_name in app_settings.CLASSY_DOC_ALSO_EXCLUDE:
+                    if full_name in matcher.also_exclude:
                         continue
 
                     klasses.append(full_name)
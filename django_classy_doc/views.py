@@ -1,33 +1,238 @@
-from django.http import Http404
-from django.views.generic import TemplateView
+import inspect
+import json
+import logging
+import pydoc
 
-from .utils import build_context, build_list_of_documentables, get_index_context
+from asgiref.sync import sync_to_async
+import django
+from django.core.handlers.asgi import ASGIRequest
+from django.http import Http404, HttpResponse, StreamingHttpResponse
+from django.template.loader import render_to_string
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+from django.utils.safestring import mark_safe
+from django.views.generic import TemplateView, View
+
+from .cache import get_cache, get_cached_page, get_page, make_page, set_page
+from .matching import get_matcher
+from .profiling import phase, profile
+from .utils import build_context, build_list_of_documentables, get_index_context, get_method_source
 from . import settings as app_settings
 
 
-class ClassyView(TemplateView):
+logger = logging.getLogger(__name__)
+
+
+CONTENT_MARKER = '<!-- classy-doc-content -->'
+
+
+def render_frame(context):
+    """Return the markup of `base.html` before and after the content of a page."""
+    html = render_to_string('django_classy_doc/frame.html', {**context, 'content': mark_safe(CONTENT_MARKER)})
+    return html.split(CONTENT_MARKER)
+
+
+async def iterate_async(chunks):
+    """Consume `chunks` in a worker thread one chunk at a time, so that ASGI servers stream them too."""
+    chunks = iter(chunks)
+    next_chunk = sync_to_async(next, thread_sensitive=True)
+    while True:
+        chunk = await next_chunk(chunks, None)
+        if chunk is None:
+            return
+        yield chunk
+
+
+def locate_documented(klass):
+    """Import the documented class `klass`, raising Http404 if it can't be."""
+    if not get_matcher().is_documented(klass):
+        raise Http404(f'Undocumented class {klass}')
+
+    try:
+        obj = pydoc.locate(klass)
+    except pydoc.ErrorDuringImport:
+        raise Http404(f'Unable to import {klass}')
+    if not inspect.isclass(obj):
+        raise Http404(f'Unable to import {klass}')
+
+    # Like build(), only classes defined in CLASSY_DOC_BASES are documented, wherever they are imported
+    matcher = get_matcher()
+    if not matcher.is_base(obj.__module__) and f'{obj.__module__}.{obj.__name__}' not in matcher.also_include:
+        raise Http404(f'Undocumented class {klass}')
+    return obj
+
+
+def is_method(value):
+    """Whether `value`, from the `__dict__` of a class, is documented as a method."""
+    return inspect.isroutine(value) or isinstance(value, (classmethod, staticmethod, property))
+
+
+class CachedPageMixin:
+    """Serve pages from the `CLASSY_DOC_CACHE` backend, with ETag and Last-Modified headers.
+
+    With `CLASSY_DOC_STREAMING`, views that can be streamed send the pages missing from the cache
+    chunk by chunk, caching them once complete.
+    """
+    content_type = None
+    streaming = False
+
+    def get_page_name(self):
+        raise NotImplementedError
+
+    def get_cache_name(self):
+        name = self.get_page_name()
+        if app_settings.CLASSY_DOC_HIGHLIGHT:
+            name = f'{name}:highlight'
+        if app_settings.CLASSY_DOC_COMPACT:
+            name = f'{name}:compact'
+        return name
+
+    def render_page(self):
+        context = self.get_context_data(**self.kwargs)
+        with phase('render', self.kwargs.get('klass')):
+            return render_to_string(self.template_name, context)
+
+    def get_page(self):
+        return get_page(self.get_cache_name(), self.render_page)
+
+    def check(self):
+        """Raise Http404 for pages that can't be rendered, before any of them is streamed."""
+
+    def stream_page(self):
+        """Yield the page in chunks, the first ones as early as possible."""
+        raise NotImplementedError
+
+    def stream(self, request):
+        self.check()
+        name = self.get_cache_name()
+
+        def chunks():
+            content = []
+            for chunk in self.stream_page():
+                content.append(chunk)
+                yield chunk
+            set_page(name, make_page(''.join(content)))
+
+        if isinstance(request, ASGIRequest) and django.VERSION >= (4, 2):
+            # Older versions don't accept asynchronous iterators, and iterate in the event loop
+            return StreamingHttpResponse(iterate_async(chunks()), content_type=self.content_type)
+        return StreamingHttpResponse(chunks(), content_type=self.content_type)
+
+    def get(self, request, *args, **kwargs):
+        if app_settings.CLASSY_DOC_PROFILE:
+            with profile() as profiler:
+                page = self.get_page()
+            logger.info('Profile of %s\n%s', request.path, profiler.report())
+        elif self.streaming and app_settings.CLASSY_DOC_STREAMING:
+            page = get_cached_page(self.get_cache_name())
+            if page is None:
+                return self.stream(request)
+        else:
+            page = self.get_page()
+
+        response = HttpResponse(page['content'], content_type=self.content_type)
+        response.headers['ETag'] = page['etag']
+        # Without a cache, pages are rendered on every request and the time they were rendered tells nothing
+        last_modified = page['last_modified'] if get_cache() is not None else None
+        if last_modified is not None:
+            response.headers['Last-Modified'] = http_date(last_modified)
+        return get_conditional_response(
+            request, etag=page['etag'], last_modified=last_modified, response=response,
+        )
+
+
+class ClassyView(CachedPageMixin, TemplateView):
     template_name = 'django_classy_doc/klass.html'
+    streaming = True
+    sections = ['heading', 'meta', 'fields', 'attributes', 'methods', 'everything']
+    compact_sections = [
+        'heading', 'meta', 'compact/assets', 'compact/fields', 'compact/attributes', 'compact/methods', 'everything',
+    ]
+
+    def get_page_name(self):
+        if app_settings.CLASSY_DOC_LAZY_SOURCE:
+            return f'klass:{self.kwargs["klass"]}:lazy'
+        return f'klass:{self.kwargs["klass"]}'
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         klass = self.kwargs['klass']
+        lazy = app_settings.CLASSY_DOC_LAZY_SOURCE
 
         try:
-            context['klass'] = build_context(klass, exit=False)
+            context['klass'] = build_context(klass, exit=False, source=not lazy)
         except ImportError:
             raise Http404(f'Unable to import {klass}')
         if context['klass'] is False:
             raise Http404(f'Undocuemented class {klass}')
         context['known_apps'] = app_settings.CLASSY_DOC_KNOWN_APPS
 
+        if lazy:
+            # Served by ClassySourceView when the method is expanded
+            for name, declarations in context['klass']['methods'].items():
+                for declaration in declarations:
+                    del declaration['docstring']
+                    declaration['source_url'] = f'./{klass}/{".".join(declaration["defining_class"])}/{name}.json'
+
         return context
 
+    def check(self):
+        locate_documented(self.kwargs['klass'])
+
+    def stream_page(self):
+        klass = self.kwargs['klass']
+        head, tail = render_frame({'klass': {'name': klass.rpartition('.')[2]}})
+        yield head
+
+        context = self.get_context_data(**self.kwargs)
+        sections = self.compact_sections if app_settings.CLASSY_DOC_COMPACT else self.sections
+        for section in sections:
+            with phase('render', klass):
+                yield render_to_string(f'django_classy_doc/klass/{section}.html', context)
+        yield tail
+
 
-class ClassyIndexView(TemplateView):
+class ClassyIndexView(CachedPageMixin, TemplateView):
     template_name = 'django_classy_doc/index.html'
+    streaming = True
+    # The documented apps, when already known
+    apps = None
+
+    def get_page_name(self):
+        return 'index'
+
+    def get_apps(self):
+        if self.apps is None:
+            self.apps, _ = build_list_of_documentables()
+        return self.apps
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        apps, _ = build_list_of_documentables()
-        context.update(get_index_context(apps))
+        context.update(get_index_context(self.get_apps()))
         return context
+
+    def stream_page(self):
+        head, tail = render_frame({})
+        yield head + render_to_string('django_classy_doc/index/heading.html')
+
+        for app, modules in get_index_context(self.get_apps())['apps'].items():
+            yield render_to_string('django_classy_doc/index/app.html', {'app': app, 'modules': modules})
+        yield tail
+
+
+class ClassySourceView(CachedPageMixin, View):
+    """The docstring and source of a method, as json, for pages built with `CLASSY_DOC_LAZY_SOURCE`."""
+    content_type = 'application/json'
+
+    def get_page_name(self):
+        return 'source:{klass}:{defining}:{name}'.format(**self.kwargs)
+
+    def render_page(self):
+        klass, defining, name = self.kwargs['klass'], self.kwargs['defining'], self.kwargs['name']
+        obj = locate_documented(klass)
+
+        # Only the methods of the ancestors of the documented class may be looked into
+        for cls in inspect.getmro(obj):
+            if f'{cls.__module__}.{cls.__name__}' == defining and is_method(cls.__dict__.get(name)):
+                return json.dumps(get_method_source(cls, name))
+        raise Http404(f'{defining} is not an ancestor of {klass} defining a method {name}')
@@ -0,0 +1,110 @@
+import logging
+import os
+import queue
+import sys
+import threading
+import time
+
+from django.apps import apps as app_registry
+from django.http import Http404
+from django.utils.autoreload import DJANGO_AUTORELOAD_ENV
+
+from . import settings as app_settings
+from .cache import get_cache
+from .utils import build_context, build_list_of_documentables
+
+
+logger = logging.getLogger(__name__)
+
+
+MANAGEMENT_SCRIPTS = {'manage.py', 'django-admin', 'django-admin.py', '__main__.py'}
+
+
+def should_warm_up():
+    """Whether this process is the one of `runserver` serving pages, rather than its autoreloader.
+
+    Processes run by WSGI or ASGI servers can't be told apart from others (test runners, workers, scripts...), they
+    call `start_warm_up` from their `wsgi.py` or `asgi.py` instead.
+    """
+    argv = getattr(sys, 'argv', None) or ['']
+    if os.path.basename(argv[0]) not in MANAGEMENT_SCRIPTS or argv[1:2] != ['runserver']:
+        return False
+    return '--noreload' in argv or os.environ.get(DJANGO_AUTORELOAD_ENV) == 'true'
+
+
+def warm_class(klass):
+    """Render the page of `klass` into the cache of the views, only classify it if caching is disabled."""
+    from .views import ClassyView
+
+    if get_cache() is None:
+        build_context(klass, exit=False, source=not app_settings.CLASSY_DOC_LAZY_SOURCE)
+    else:
+        ClassyView(kwargs={'klass': klass}).get_page()
+
+
+def warm_up(concurrency=None):
+    """Build the index and the page of every documented class, `concurrency` at a time."""
+    from .views import ClassyIndexView
+
+    # Started from AppConfig.ready, before the registry is marked ready
+    while not app_registry.ready:
+        time.sleep(0.1)
+
+    start = time.perf_counter()
+    apps, klasses = build_list_of_documentables()
+    if get_cache() is not None:
+        ClassyIndexView(kwargs={}, apps=apps).get_page()
+
+    # Daemon threads rather than an executor, whose workers would delay the exit of the process
+    pending = queue.SimpleQueue()
+    for klass in klasses:
+        pending.put(klass)
+    failed = []
+
+    def worker():
+        while True:
+            try:
+                klass = pending.get_nowait()
+            except queue.Empty:
+                return
+            try:
+                warm_class(klass)
+            except (Http404, ImportError) as e:
+                failed.append(klass)
+                logger.debug('Unable to warm %s up: %s', klass, e)
+            except Exception:
+                failed.append(klass)
+                logger.exception('Unable to warm %s up', klass)
+
+    workers = [
+        threading.Thread(target=worker, name=f'classy-doc-warmup-{i}', daemon=True)
+        for i in range(concurrency or app_settings.CLASSY_DOC_WARMUP_CONCURRENCY)
+    ]
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+
+    elapsed = time.perf_counter() - start
+    logger.info('Warmed %d classes up in %.1fs, %d failed', len(klasses) - len(failed), elapsed, len(failed))
+
+
+_started = None
+_lock = threading.Lock()
+
+
+def start_warm_up():
+    """Warm the cache up in a daemon thread, never delaying startup or outliving the process.
+
+    Does nothing unless `CLASSY_DOC_WARMUP` is on, and starts a single thread per process however often it's called:
+    `runserver` both calls it from `AppConfig.ready` and imports `wsgi.py`.
+    """
+    global _started
+
+    if not app_settings.CLASSY_DOC_WARMUP:
+        return None
+    with _lock:
+        if _started is None:
+            _started = threading.Thread(target=warm_up, name='classy-doc-warmup', daemon=True)
+            _started.start()
+    return _started
@@ -0,0 +1,124 @@
+from collections import defaultdict
+import importlib.util
+import os
+
+from .manifest import module_file
+
+
+def ancestor_file(ancestor):
+    """Return the module file defining the class `ancestor`, importing nothing but its parent packages."""
+    module = ancestor.rpartition('.')[0]
+    filename = module_file(module)
+    if filename is None:
+        try:
+            spec = importlib.util.find_spec(module)
+        except (ImportError, ValueError):
+            return None
+        if spec is None or not spec.has_location:
+            return None
+        filename = spec.origin
+    return os.path.abspath(filename)
+
+
+class ReverseIndex:
+    """The documented pages inheriting from every ancestor, and the ancestors defined in every file.
+
+    Built from the entries of a `Manifest`, and updated page by page as they are rebuilt.
+    """
+
+    def __init__(self):
+        self.entries = {}
+        self.descendants = defaultdict(set)
+        self.defined_in = defaultdict(set)
+        self.users = defaultdict(set)
+        self._files = {}
+
+    @classmethod
+    def from_manifest(cls, manifest, output_format=None):
+        """Index the pages of `manifest`, only those written as `output_format` if given."""
+        index = cls()
+        for filename, entry in manifest.entries.items():
+            if output_format is None or filename.endswith(f'.{output_format}'):
+                index.update(filename, entry)
+        return index
+
+    def file_of(self, ancestor):
+        if ancestor not in self._files:
+            self._files[ancestor] = ancestor_file(ancestor)
+        return self._files[ancestor]
+
+    def remove(self, page):
+        entry = self.entries.pop(page, None)
+        if entry is None:
+            return
+        for ancestor in entry['ancestors']:
+            self.descendants[ancestor].discard(page)
+        for filename in entry['files']:
+            self.users[filename].discard(page)
+
+    def update(self, page, entry):
+        self.remove(page)
+        self.entries[page] = entry
+        for ancestor in entry['ancestors']:
+            self.descendants[ancestor].add(page)
+            filename = self.file_of(ancestor)
+            if filename is not None:
+                self.defined_in[filename].add(ancestor)
+        for filename in entry['files']:
+            self.users[filename].add(page)
+
+    def files(self):
+        files = {filename for filename, pages in self.users.items() if pages}
+        files.update(
+            filename for filename, ancestors in self.defined_in.items()
+            if any(self.descendants[ancestor] for ancestor in ancestors)
+        )
+        return files
+
+    def affected(self, filenames):
+        """Return the pages inheriting from a class defined in, or reading sources from, any of `filenames`."""
+        pages = set()
+        for filename in filenames:
+            for ancestor in self.defined_in.get(filename, ()):
+                pages.update(self.descendants.get(ancestor, ()))
+            pages.update(self.users.get(filename, ()))
+        return {page: self.entries[page]['klass'] for page in pages if page in self.entries}
+
+
+class Watcher:
+    """Poll the sources behind the pages of a manifest, written as `output_format`, for changes."""
+
+    def __init__(self, manifest, output_format=None):
+        self.index = ReverseIndex.from_manifest(manifest, output_format)
+        self.mtimes = {}
+        self.snapshot()
+
+    @staticmethod
+    def mtime(filename):
+        try:
+            return os.stat(filename).st_mtime_ns
+        except OSError:
+            return None
+
+    def snapshot(self):
+        for filename in self.index.files():
+            self.mtimes.setdefault(filename, self.mtime(filename))
+
+    def poll(self):
+        """Return the watched files modified since the previous poll."""
+        changed = []
+        for filename in sorted(self.index.files()):
+            mtime = self.mtime(filename)
+            if mtime != self.mtimes.get(filename):
+                self.mtimes[filename] = mtime
+                changed.append(filename)
+        return changed
+
+    def update(self, manifest, pages):
+        """Reindex `pages` from `manifest`, once rebuilt."""
+        for page in pages:
+            if page in manifest.entries:
+                self.index.update(page, manifest.entries[page])
+            else:
+                self.index.remove(page)
+        self.snapshot()
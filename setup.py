@@ -40,6 +40,10 @@ setup(
     ],
     install_requires=[
         'Django>=3.2',
-    ]
+    ],
+    extras_require={
+        'highlight': ['Pygments'],
+        'msgpack': ['msgpack'],
+    },
 )
 
@@ -14,3 +14,8 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'django_classy_doc.settings')
 
 application = get_wsgi_application()
+
+# Render the documentation into the cache in the background, when CLASSY_DOC_WARMUP is on
+from django_classy_doc.warmup import start_warm_up  # noqa: E402
+
+start_warm_up()